@@ -32,8 +32,18 @@ if [ ! -f "requirements.txt" ]; then
     exit 1
 fi
 
+# The service imports email_common from api/shared, which a deploy of this directory alone doesn't upload
+if [ ! -f "../shared/email_common.py" ]; then
+    echo "❌ ../shared/email_common.py not found. Please run this script from a full checkout."
+    exit 1
+fi
+
 echo "✅ Prerequisites check passed"
 
+# Bundle the shared module next to flask_app.py for the duration of the deploy
+cp ../shared/email_common.py email_common.py
+trap 'rm -f email_common.py' EXIT
+
 # Deploy to Vercel
 echo "📦 Deploying to Vercel..."
 vercel --prod
@@ -1,5 +1,7 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, TemplateSyntaxError, select_autoescape
 import os
+import sys
 import smtplib
 import ssl
 from email.mime.text import MIMEText
@@ -8,18 +10,34 @@ from email.mime.base import MIMEBase
 from email import encoders
 import uuid
 import json
-import requests
+import atexit
 from datetime import datetime, timedelta
 import logging
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Iterable, Iterator, Optional, Tuple
 import hashlib
 import hmac
+import click
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# Code shared with the other email service lives in api/shared; deploy.sh copies it next to this
+# file for standalone deploys, and that copy wins since api/shared is only appended to the path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared'))
+from email_common import (
+    AsyncSupabaseClient, check_deadline, CircuitBreaker, create_outbox_store, DeadlineExceeded,
+    init_request_deadlines, is_transient_smtp_error, OutboxStore, RenderedEmailCache,
+    REQUEST_DEADLINE, retry_delay, SendRateLimiter, SMTP_RETRY_ATTEMPTS, SMTP_TIMEOUT,
+    STAGE_RESERVES, stage_timeout, SupabaseClient, TextSkeletonLoader, tidy_text
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+init_request_deadlines(app)
 
 # Configuration
 SUPABASE_URL = os.getenv('SUPABASE_URL')
@@ -28,11 +46,260 @@ SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
 SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
 SMTP_USERNAME = os.getenv('SMTP_USERNAME')
 SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
+SMTP_USE_TLS = os.getenv('SMTP_USE_TLS', 'true').lower() == 'true'
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
 SECRET_KEY = os.getenv('SECRET_KEY', 'c057f320112909a9eedff367f37a554c65ab7363cccb2f6366d5c1606446938d')
 
+# SMTP connection pool settings
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', '4'))
+SMTP_POOL_IDLE_TTL = float(os.getenv('SMTP_POOL_IDLE_TTL', '60'))
+SMTP_POOL_HEALTHCHECK_AFTER = float(os.getenv('SMTP_POOL_HEALTHCHECK_AFTER', '10'))
+
+# Over-budget sends wait in a durable outbox (sqlite:/// or postgres:// URL) until the budget frees up
+SMTP_DEFERRED_URL = os.getenv('SMTP_DEFERRED_URL', f"sqlite:///{os.path.join(tempfile.gettempdir(), 'email-service-deferred.db')}")
+SMTP_DEFERRED_BATCH_SIZE = int(os.getenv('SMTP_DEFERRED_BATCH_SIZE', '20'))
+SMTP_DEFERRED_LEASE = float(os.getenv('SMTP_DEFERRED_LEASE', '120'))
+SMTP_DEFERRED_POLL_INTERVAL = float(os.getenv('SMTP_DEFERRED_POLL_INTERVAL', '5'))
+
+# What send_email reports: delivered now, or accepted into the deferred queue
+EMAIL_SENT = 'sent'
+EMAIL_QUEUED = 'queued'
+
 # Email templates directory
 TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'email', 'templates')
+# Compiled template bytecode survives restarts here (empty disables)
+TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'email-service-templates'))
+class SMTPConnectionPool:
+    """Pool of authenticated SMTP sessions reused across sends"""
+
+    def __init__(self, server: str, port: int, username: str, password: str,
+                 use_tls: bool = SMTP_USE_TLS, size: int = SMTP_POOL_SIZE, idle_ttl: float = SMTP_POOL_IDLE_TTL,
+                 healthcheck_after: float = SMTP_POOL_HEALTHCHECK_AFTER):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = max(1, size)
+        self.idle_ttl = idle_ttl
+        self.healthcheck_after = healthcheck_after
+        self._idle = []  # (connection, last_used) pairs, most recently used last
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._stats = {'created': 0, 'reused': 0, 'expired': 0, 'reconnects': 0, 'retries': 0, 'in_use': 0,
+                       'slot_timeouts': 0}
+        self.breaker = CircuitBreaker('smtp')
+
+    def _connect(self) -> smtplib.SMTP:
+        """Open a new SMTP session, upgrade to TLS and authenticate"""
+        server = smtplib.SMTP(self.server, self.port, timeout=stage_timeout('send', SMTP_TIMEOUT))
+        try:
+            if self.use_tls:
+                server.starttls(context=ssl.create_default_context())
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        with self._lock:
+            self._stats['created'] += 1
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _is_healthy(self, server: smtplib.SMTP, last_used: float) -> bool:
+        """Connections idle for a while get a NOOP before being trusted again"""
+        if time.monotonic() - last_used < self.healthcheck_after:
+            return True
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+            if time.monotonic() - last_used > self.idle_ttl:
+                with self._lock:
+                    self._stats['expired'] += 1
+                self._close(server)
+                continue
+            if self._is_healthy(server, last_used):
+                with self._lock:
+                    self._stats['reused'] += 1
+                return server
+            with self._lock:
+                self._stats['expired'] += 1
+            self._close(server)
+        return self._connect()
+
+    def _checkin(self, server: smtplib.SMTP):
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """Borrow an authenticated connection; broken connections are discarded.
+
+        Waiting for a free slot is bounded by SMTP_TIMEOUT and the request's
+        send budget; DeadlineExceeded is raised when none frees up in time.
+        """
+        if not self._slots.acquire(timeout=stage_timeout('send', SMTP_TIMEOUT)):
+            with self._lock:
+                self._stats['slot_timeouts'] += 1
+            raise DeadlineExceeded('send')
+        try:
+            server = self._checkout()
+            with self._lock:
+                self._stats['in_use'] += 1
+            try:
+                yield server
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+                # The server rejected the message but the session is still usable
+                self._checkin(server)
+                raise
+            except Exception:
+                self._close(server)
+                raise
+            else:
+                self._checkin(server)
+            finally:
+                with self._lock:
+                    self._stats['in_use'] -= 1
+        finally:
+            self._slots.release()
+
+    def send_message(self, msg, attempts: int = SMTP_RETRY_ATTEMPTS) -> None:
+        """Send a message, retrying transient failures with jittered backoff.
+
+        A pooled session dropped by the server is replaced and retried at once;
+        other transient errors wait before the next attempt. Every attempt is
+        bounded by SMTP_TIMEOUT and the request's send budget, and goes through
+        the circuit breaker.
+        """
+        attempt = 0
+        while True:
+            try:
+                timeout = stage_timeout('send', SMTP_TIMEOUT)
+                with self.breaker.call(is_transient_smtp_error), self.connection() as server:
+                    server.sock.settimeout(timeout)
+                    server.send_message(msg)
+                    return
+            except Exception as e:
+                attempt += 1
+                if attempt >= attempts or not is_transient_smtp_error(e):
+                    raise
+                stale_session = attempt == 1 and isinstance(e, smtplib.SMTPServerDisconnected)
+                with self._lock:
+                    self._stats['reconnects' if stale_session else 'retries'] += 1
+                if not stale_session:
+                    delay = retry_delay(attempt)
+                    logger.warning(f"Transient SMTP error ({str(e)}), retrying in {delay:.2f}s")
+                    time.sleep(stage_timeout('send', delay))
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': self.size,
+                'idle_ttl': self.idle_ttl,
+                'idle': len(self._idle),
+                **self._stats
+            }
+
+send_limiter = SendRateLimiter()
+
+class DeferredSendQueue:
+    """Over-budget sends parked in an outbox store and delivered once the budget frees up.
+
+    The store is a database, so queued emails survive a restart and several
+    worker processes can share it; each row is claimed by one of them at a time.
+    """
+
+    def __init__(self, deliver: Callable[..., bool], url: str = SMTP_DEFERRED_URL,
+                 batch_size: int = SMTP_DEFERRED_BATCH_SIZE, lease: float = SMTP_DEFERRED_LEASE,
+                 poll_interval: float = SMTP_DEFERRED_POLL_INTERVAL):
+        self.deliver = deliver
+        self.url = url
+        self.batch_size = batch_size
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._store: Optional[OutboxStore] = None
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> OutboxStore:
+        """Open the store and start the delivery thread on first use"""
+        return self.start()
+
+    def start(self) -> OutboxStore:
+        with self._lock:
+            if self._store is None:
+                self._store = create_outbox_store(self.url)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='smtp-deferred', daemon=True)
+                self._thread.start()
+            return self._store
+
+    def defer(self, delay: float, email: Dict[str, Any]) -> str:
+        message_id = self.store.enqueue(email, delay=delay)
+        self._wakeup.set()
+        return message_id
+
+    def pending(self) -> int:
+        counts = self.store.counts()
+        return counts.get('queued', 0) + counts.get('sending', 0)
+
+    def _run(self):
+        while True:
+            try:
+                processed = self.drain_once()
+            except Exception as e:
+                logger.error(f"Deferred send worker error: {str(e)}")
+                processed = 0
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def drain_once(self) -> int:
+        """Deliver the deferred emails that are due and still fit the send budget"""
+        claimed = self.store.claim(self.batch_size, self.lease)
+        for item in claimed:
+            email = item['payload']
+            retry_after = send_limiter.acquire()
+            if retry_after:
+                self.store.release(item['id'], time.time() + retry_after)
+            elif self.deliver(**email):
+                self.store.mark_sent(item['id'])
+                supabase_service.log_email_sent(
+                    recipient=email['to_email'],
+                    template=email.get('template') or 'unknown',
+                    subject=email['subject'],
+                    data={'deferred_id': item['id']}
+                )
+            else:
+                # deliver() has already dead-lettered it to email_logs
+                self.store.mark_failed(item['id'], 'send failed', None)
+        return len(claimed)
 
 class EmailService:
     def __init__(self):
@@ -40,222 +307,235 @@ class EmailService:
         self.smtp_port = SMTP_PORT
         self.username = SMTP_USERNAME
         self.password = SMTP_PASSWORD
-        
-    def send_email(self, to_email: str, subject: str, html_content: str, text_content: str = None) -> bool:
-        """Send email using SMTP"""
+        self.pool = SMTPConnectionPool(self.smtp_server, self.smtp_port, self.username, self.password)
+        self.deferred = DeferredSendQueue(self.deliver)
+    
+    def build_message(self, to_email: str, subject: str, html_content: str, text_content: str = None) -> MIMEMultipart:
+        """Assemble the MIME message for an email"""
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = self.username
+        msg['To'] = to_email
+        
+        # Add text and HTML parts
+        if text_content:
+            text_part = MIMEText(text_content, 'plain')
+            msg.attach(text_part)
+        
+        html_part = MIMEText(html_content, 'html')
+        msg.attach(html_part)
+        return msg
+        
+    def send_email(self, to_email: str, subject: str, html_content: str, text_content: str = None,
+                   template: str = None) -> Optional[str]:
+        """Send email over a pooled SMTP connection.
+
+        Returns EMAIL_SENT once delivered, EMAIL_QUEUED when the send budget
+        is exhausted and the email went to the deferred queue, or None when it
+        failed (failures are dead-lettered).
+        """
+        retry_after = send_limiter.acquire()
+        if retry_after:
+            logger.warning(f"Send budget exhausted, deferring email to {to_email} by {retry_after:.1f}s")
+            self.deferred.defer(retry_after, {
+                'to_email': to_email,
+                'subject': subject,
+                'html_content': html_content,
+                'text_content': text_content,
+                'template': template
+            })
+            return EMAIL_QUEUED
+        return EMAIL_SENT if self.deliver(to_email, subject, html_content, text_content, template) else None
+    
+    def deliver(self, to_email: str, subject: str, html_content: str, text_content: str = None,
+                template: str = None) -> bool:
+        """Send one email now, without consulting the send budget; failures are dead-lettered"""
         try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = self.username
-            msg['To'] = to_email
-            
-            # Add text and HTML parts
-            if text_content:
-                text_part = MIMEText(text_content, 'plain')
-                msg.attach(text_part)
-            
-            html_part = MIMEText(html_content, 'html')
-            msg.attach(html_part)
+            msg = self.build_message(to_email, subject, html_content, text_content)
             
             # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls(context=ssl.create_default_context())
-                server.login(self.username, self.password)
-                server.send_message(msg)
+            self.pool.send_message(msg)
             
             logger.info(f"Email sent successfully to {to_email}")
             return True
             
         except Exception as e:
             logger.error(f"Failed to send email to {to_email}: {str(e)}")
+            supabase_service.log_email_failed(
+                recipient=to_email,
+                template=template or 'unknown',
+                subject=subject,
+                message={'recipients': [to_email], 'subject': subject, 'html': html_content, 'body': text_content},
+                error=str(e)
+            )
             return False
 
+class TemplateRegistry:
+    """Compiles each template once and serves it from memory.
+
+    The loader records every file's mtime, so an edited template (or the base
+    layout it extends) is recompiled on its next lookup. Compiled bytecode is
+    also written to cache_dir, letting a fresh process skip the compile step.
+    """
+
+    def __init__(self, templates_dir: str, cache_dir: Optional[str] = TEMPLATE_CACHE_DIR):
+        self.templates_dir = templates_dir
+        self.cache_dir = self._prepare_cache_dir(cache_dir)
+        self.env = Environment(
+            loader=FileSystemLoader(templates_dir),
+            autoescape=select_autoescape(),
+            auto_reload=True,
+            bytecode_cache=FileSystemBytecodeCache(self.cache_dir) if self.cache_dir else None
+        )
+        # Plain-text alternatives compile from the same files, cached under their own keys
+        self.text_env = self.env.overlay(
+            loader=TextSkeletonLoader(self.env.loader),
+            autoescape=False,
+            bytecode_cache=FileSystemBytecodeCache(self.cache_dir, '__jinja2_text_%s.cache') if self.cache_dir else None
+        )
+
+    @staticmethod
+    def _prepare_cache_dir(cache_dir: Optional[str]) -> Optional[str]:
+        if not cache_dir:
+            return None
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            return cache_dir
+        except OSError as e:
+            logger.warning(f"Template bytecode cache disabled ({cache_dir}): {str(e)}")
+            return None
+
+    def get(self, name: str) -> Template:
+        """Compiled template, recompiled only if its file changed"""
+        return self.env.get_template(name)
+
+    def get_text(self, name: str) -> Template:
+        """Compiled plain-text skeleton of a template"""
+        return self.text_env.get_template(name)
+
+    def source(self, name: str) -> str:
+        return self.env.loader.get_source(self.env, name)[0]
+
+    def warm(self) -> int:
+        """Compile every template up front so the first request doesn't pay for it"""
+        compiled = 0
+        for name in self.env.list_templates(extensions=['html']):
+            try:
+                self.get(name)
+                self.get_text(name)
+                compiled += 1
+            except TemplateSyntaxError as e:
+                # password_reset.html is a Supabase Auth (Go) template, not Jinja
+                logger.debug(f"Skipping template {name}: {str(e)}")
+            except Exception as e:
+                logger.error(f"Failed to compile template {name}: {str(e)}")
+        return compiled
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'compiled': len(self.env.cache) if self.env.cache is not None else 0,
+            'compiled_text': len(self.text_env.cache) if self.text_env.cache is not None else 0,
+            'bytecode_cache': self.cache_dir
+        }
+
 class TemplateService:
-    def __init__(self):
+    def __init__(self, registry: TemplateRegistry = None, cache: RenderedEmailCache = None):
         self.templates_dir = TEMPLATES_DIR
+        self.registry = registry or TemplateRegistry(TEMPLATES_DIR)
+        self.cache = cache or RenderedEmailCache()
         
     def load_template(self, template_name: str) -> str:
-        """Load HTML template from file"""
+        """Load HTML template source"""
         try:
-            template_path = os.path.join(self.templates_dir, f"{template_name}.html")
-            with open(template_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            return self.registry.source(f"{template_name}.html")
         except Exception as e:
             logger.error(f"Failed to load template {template_name}: {str(e)}")
             return ""
     
     def render_template(self, template_name: str, **kwargs) -> str:
-        """Load and render template with variables"""
-        template_content = self.load_template(template_name)
-        if template_content:
-            # Simple template rendering without Flask context
-            try:
-                return render_template_string(template_content, **kwargs)
-            except RuntimeError:
-                # Fallback to simple string replacement for testing
-                rendered = template_content
-                for key, value in kwargs.items():
-                    rendered = rendered.replace(f'{{{{ {key} }}}}', str(value))
-                    rendered = rendered.replace(f'{{{{{key}}}}}', str(value))
-                return rendered
-        return ""
-
-class SupabaseService:
-    def __init__(self):
-        self.url = SUPABASE_URL
-        self.service_key = SUPABASE_SERVICE_KEY
-        self.headers = {
-            'apikey': self.service_key,
-            'Authorization': f'Bearer {self.service_key}',
-            'Content-Type': 'application/json'
-        }
-    
-    def get_hours_by_id(self, hours_id: str) -> Optional[Dict[str, Any]]:
-        """Get volunteer hours by ID"""
+        """Render a compiled template with variables; render errors propagate so no blank email goes out"""
         try:
-            response = requests.get(
-                f"{self.url}/rest/v1/volunteer_hours?id=eq.{hours_id}",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data[0] if data else None
+            return self.registry.get(f"{template_name}.html").render(**kwargs)
         except Exception as e:
-            logger.error(f"Failed to get hours: {str(e)}")
-            return None
+            logger.error(f"Failed to render template {template_name}: {str(e)}")
+            raise
     
-    def update_hours_status(self, hours_id: str, status: str, verified_by: str, notes: str = None) -> bool:
-        """Update volunteer hours status"""
+    def render_text(self, template_name: str, **kwargs) -> str:
+        """Render the plain-text alternative from the template's cached text skeleton"""
         try:
-            update_data = {
-                'status': status,
-                'verified_by': verified_by,
-                'verification_date': datetime.utcnow().isoformat(),
-                'verification_notes': notes,
-                'updated_at': datetime.utcnow().isoformat()
-            }
-            
-            response = requests.patch(
-                f"{self.url}/rest/v1/volunteer_hours?id=eq.{hours_id}",
-                headers=self.headers,
-                json=update_data
-            )
-            response.raise_for_status()
-            
-            logger.info(f"Hours {hours_id} status updated to {status}")
-            return True
-            
+            return tidy_text(self.registry.get_text(f"{template_name}.html").render(**kwargs))
         except Exception as e:
-            logger.error(f"Failed to update hours status: {str(e)}")
-            return False
+            logger.error(f"Failed to render text for template {template_name}: {str(e)}")
+            raise
     
-    def get_student_profile(self, student_id: str) -> Optional[Dict[str, Any]]:
-        """Get student profile by ID"""
-        try:
-            response = requests.get(
-                f"{self.url}/rest/v1/profiles?id=eq.{student_id}",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data[0] if data else None
-        except Exception as e:
-            logger.error(f"Failed to get student profile: {str(e)}")
-            return None
+    def render(self, template_name: str, **kwargs) -> Tuple[str, str]:
+        """Render the HTML body and its plain-text alternative"""
+        check_deadline('render')
+        return self.render_template(template_name, **kwargs), self.render_text(template_name, **kwargs)
     
-    def get_opportunity_by_id(self, opportunity_id: str) -> Optional[Dict[str, Any]]:
+    def render_cached(self, template_name: str, volatile: Iterable[str] = (), **kwargs) -> Tuple[str, str]:
+        """render() through the rendered-body cache, for routes that get retried"""
+        return self.cache.render(template_name, kwargs, lambda: self.render(template_name, **kwargs), volatile)
+    
+    def render_many(self, template_name: str, contexts: Iterable[Dict[str, Any]]) -> Iterator[Tuple[str, str]]:
+        """Render one template for many contexts, yielding (html, text) per context.
+
+        The compiled template and its text skeleton are looked up once for
+        the whole batch rather than once per email.
+        """
+        check_deadline('render')
+        html_template = self.registry.get(f"{template_name}.html")
+        text_template = self.registry.get_text(f"{template_name}.html")
+        for context in contexts:
+            yield html_template.render(context), tidy_text(text_template.render(context))
+
+# The legacy opportunities table doesn't have every column the templates ask for, so take it whole
+OPPORTUNITY_FIELDS = ('*',)
+REGISTRATION_FIELDS = ('id', 'opportunity_id', 'student_id', 'status')
+
+class AsyncSupabaseService(AsyncSupabaseClient):
+    def __init__(self):
+        super().__init__(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    
+    async def get_opportunity_by_id(self, opportunity_id: str) -> Optional[Dict[str, Any]]:
         """Get opportunity by ID"""
         try:
-            response = requests.get(
-                f"{self.url}/rest/v1/opportunities?id=eq.{opportunity_id}",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data[0] if data else None
+            return await self.get_one('opportunities', opportunity_id, OPPORTUNITY_FIELDS)
         except Exception as e:
             logger.error(f"Failed to get opportunity: {str(e)}")
             return None
     
-    def get_registration_by_id(self, registration_id: str) -> Optional[Dict[str, Any]]:
+    async def get_registration_by_id(self, registration_id: str) -> Optional[Dict[str, Any]]:
         """Get registration by ID"""
         try:
-            response = requests.get(
-                f"{self.url}/rest/v1/opportunity_registrations?id=eq.{registration_id}",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data[0] if data else None
+            return await self.get_one('opportunity_registrations', registration_id, REGISTRATION_FIELDS)
         except Exception as e:
             logger.error(f"Failed to get registration: {str(e)}")
             return None
+
+class SupabaseService(SupabaseClient):
+    def __init__(self):
+        super().__init__(AsyncSupabaseService())
     
-    def get_admin_profile(self, admin_id: str) -> Optional[Dict[str, Any]]:
-        """Get admin profile by ID"""
-        try:
-            response = requests.get(
-                f"{self.url}/rest/v1/profiles?id=eq.{admin_id}",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data[0] if data else None
-        except Exception as e:
-            logger.error(f"Failed to get admin profile: {str(e)}")
-            return None
-    
-    def log_email_sent(self, recipient: str, template: str, subject: str, data: Dict[str, Any]) -> bool:
-        """Log email sent to database"""
-        try:
-            log_data = {
-                'recipient': recipient,
-                'template': template,
-                'subject': subject,
-                'data': json.dumps(data),
-                'status': 'sent',
-                'sent_at': datetime.utcnow().isoformat()
-            }
-            
-            response = requests.post(
-                f"{self.url}/rest/v1/email_logs",
-                headers=self.headers,
-                json=log_data
-            )
-            response.raise_for_status()
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to log email: {str(e)}")
-            return False
+    def get_opportunity_by_id(self, opportunity_id: str) -> Optional[Dict[str, Any]]:
+        return self.io.run(self.aio.get_opportunity_by_id(opportunity_id))
     
-    def log_admin_activity(self, admin_id: str, action: str, details: Dict[str, Any]) -> bool:
-        """Log admin activity"""
-        try:
-            log_data = {
-                'admin_id': admin_id,
-                'action': action,
-                'details': json.dumps(details),
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            
-            response = requests.post(
-                f"{self.url}/rest/v1/admin_activity_logs",
-                headers=self.headers,
-                json=log_data
-            )
-            response.raise_for_status()
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to log admin activity: {str(e)}")
-            return False
+    def get_registration_by_id(self, registration_id: str) -> Optional[Dict[str, Any]]:
+        return self.io.run(self.aio.get_registration_by_id(registration_id))
 
 # Initialize services
 email_service = EmailService()
 template_service = TemplateService()
 supabase_service = SupabaseService()
+atexit.register(supabase_service.log_buffer.close)
+
+logger.info(f"Compiled {template_service.registry.warm()} email templates")
+
+# Resume delivering emails deferred before a restart
+try:
+    email_service.deferred.start()
+except Exception as e:
+    logger.warning(f"Deferred send queue unavailable ({SMTP_DEFERRED_URL}): {str(e)}")
 
 def generate_verification_token(hours_id: str, action: str, verifier_email: str) -> str:
     """Generate a secure verification token"""
@@ -291,15 +571,74 @@ def verify_token(token: str, hours_id: str, action: str, verifier_email: str) ->
     except Exception:
         return False
 
+def dead_letter_message(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Extract the stored rendered message from a dead-letter email_logs row"""
+    data = row.get('data')
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return None
+    if not isinstance(data, dict):
+        return None
+    message = data.get('message')
+    return message if isinstance(message, dict) and message.get('html') else None
+
+@app.cli.command('replay-dead-letters')
+@click.option('--limit', default=100, help='Maximum number of failed emails to replay')
+def replay_dead_letters(limit):
+    """Re-send dead-lettered emails from email_logs without re-rendering them"""
+    rows = supabase_service.get_failed_emails(limit)
+    replayed = skipped = failed = 0
+    for row in rows:
+        message = dead_letter_message(row)
+        if not message:
+            skipped += 1
+            continue
+        try:
+            email_service.pool.send_message(email_service.build_message(
+                ', '.join(message['recipients']),
+                message['subject'],
+                message['html'],
+                message.get('body')
+            ))
+        except Exception as e:
+            logger.error(f"Replay of email log {row.get('id')} failed: {str(e)}")
+            failed += 1
+            continue
+        supabase_service.mark_email_sent(row['id'])
+        replayed += 1
+    click.echo(f"Replayed {replayed}, failed {failed}, skipped {skipped} of {len(rows)} dead-lettered emails")
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    breakers = {breaker.name: breaker.stats() for breaker in (email_service.pool.breaker, supabase_service.aio.breaker)}
     return jsonify({
-        'status': 'healthy',
+        'status': 'degraded' if any(stats['state'] != 'closed' for stats in breakers.values()) else 'healthy',
         'timestamp': datetime.utcnow().isoformat(),
-        'service': 'email-verification-service'
+        'service': 'email-verification-service',
+        'smtp_pool': email_service.pool.stats(),
+        'rate_limit': {**send_limiter.usage(), 'queued': email_service.deferred.pending()},
+        'templates': template_service.registry.stats(),
+        'render_cache': template_service.cache.stats(),
+        'supabase_pool': supabase_service.pool_stats(),
+        'profile_cache': supabase_service.profiles.stats(),
+        'singleflight': supabase_service.aio.flights.stats(),
+        'email_log_buffer': supabase_service.log_buffer.stats(),
+        'circuit_breakers': breakers,
+        'deadlines': {'request': REQUEST_DEADLINE, 'stage_reserves': STAGE_RESERVES}
     })
 
+@app.route('/cache/profiles/invalidate', methods=['POST'])
+def invalidate_profile_cache():
+    """Drop cached profiles after they change; no ids clears the whole cache"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids') or []
+    if not isinstance(ids, list):
+        return jsonify({'error': 'ids must be a list'}), 400
+    return jsonify({'success': True, 'invalidated': supabase_service.profiles.invalidate(*ids)})
+
 @app.route('/send-verification-email', methods=['POST'])
 def send_verification_email():
     """Send verification email to supervisor/organization"""
@@ -316,13 +655,14 @@ def send_verification_email():
         verifier_email = data['verifier_email']
         student_id = data['student_id']
         
-        # Get hours details from database
-        hours_data = supabase_service.get_hours_by_id(hours_id)
+        # Get hours details and the student's profile in one request
+        hours_data, student_profile = supabase_service.get_hours_with_student(hours_id)
         if not hours_data:
             return jsonify({'error': 'Hours record not found'}), 404
         
-        # Get student profile
-        student_profile = supabase_service.get_student_profile(student_id)
+        # The caller names the student; only look them up separately if it isn't the hours owner
+        if str(hours_data.get('student_id')) != str(student_id):
+            student_profile = supabase_service.get_student_profile(student_id)
         if not student_profile:
             return jsonify({'error': 'Student profile not found'}), 404
         
@@ -348,19 +688,27 @@ def send_verification_email():
         }
         
         # Render email template using new template
-        html_content = template_service.render_template('verification_request', **template_data)
+        # The signed links are regenerated per request; key on what they point at instead
+        html_content, text_content = template_service.render_cached(
+            'verification_request',
+            volatile=('approve_url', 'deny_url'),
+            hours_id=hours_id,
+            verifier_email=verifier_email,
+            **template_data
+        )
         
         # Send email
         subject = f"Volunteer Hours Verification Request - {template_data['student_name']}"
-        success = email_service.send_email(verifier_email, subject, html_content)
+        delivery = email_service.send_email(verifier_email, subject, html_content, text_content, template='verification_request')
         
-        if success:
+        if delivery:
             # Log email sent
             supabase_service.log_email_sent(
                 recipient=verifier_email,
                 template='verification_request',
                 subject=subject,
-                data=template_data
+                data=template_data,
+                status=delivery
             )
             
             return jsonify({
@@ -393,13 +741,10 @@ def verify_hours():
         if not verify_token(token, hours_id, action, verifier_email):
             return jsonify({'error': 'Invalid or expired verification token'}), 400
         
-        # Get hours data
-        hours_data = supabase_service.get_hours_by_id(hours_id)
+        # Get hours and the student's profile in one request
+        hours_data, student_profile = supabase_service.get_hours_with_student(hours_id)
         if not hours_data:
             return jsonify({'error': 'Hours record not found'}), 404
-        
-        # Get student profile
-        student_profile = supabase_service.get_student_profile(hours_data['student_id'])
         if not student_profile:
             return jsonify({'error': 'Student profile not found'}), 404
         
@@ -425,21 +770,23 @@ def verify_hours():
         
         # Send confirmation email to verifier using new templates
         if action == 'approve':
-            html_content = template_service.render_template('approval', **template_data)
+            html_content, text_content = template_service.render_cached('approval', volatile=('approval_date', 'denial_date'), **template_data)
             subject = f"Hours Approved - {template_data['student_name']}"
         else:
-            html_content = template_service.render_template('denial', **template_data)
+            html_content, text_content = template_service.render_cached('denial', volatile=('approval_date', 'denial_date'), **template_data)
             subject = f"Hours Denied - {template_data['student_name']}"
         
-        email_service.send_email(verifier_email, subject, html_content)
+        delivery = email_service.send_email(verifier_email, subject, html_content, text_content, template=f'hours_{action}')
         
         # Log the verification
-        supabase_service.log_email_sent(
-            recipient=verifier_email,
-            template=f'hours_{action}',
-            subject=subject,
-            data=template_data
-        )
+        if delivery:
+            supabase_service.log_email_sent(
+                recipient=verifier_email,
+                template=f'hours_{action}',
+                subject=subject,
+                data=template_data,
+                status=delivery
+            )
         
         return jsonify({
             'success': True,
@@ -471,13 +818,10 @@ def send_notification():
         verifier_email = data.get('verifier_email', 'Unknown')
         notes = data.get('notes', '')
         
-        # Get hours data
-        hours_data = supabase_service.get_hours_by_id(hours_id)
+        # Get hours and the student's profile in one request
+        hours_data, student_profile = supabase_service.get_hours_with_student(hours_id)
         if not hours_data:
             return jsonify({'error': 'Hours record not found'}), 404
-        
-        # Get student profile
-        student_profile = supabase_service.get_student_profile(hours_data['student_id'])
         if not student_profile:
             return jsonify({'error': 'Student profile not found'}), 404
         
@@ -495,16 +839,16 @@ def send_notification():
         }
         
         if status == 'approved':
-            html_content = template_service.render_template('hours_approved', **template_data)
+            html_content, text_content = template_service.render_cached('hours_approved', volatile=('verification_date',), **template_data)
             subject = f"Your Volunteer Hours Have Been Approved! - {template_data['student_name']}"
         else:
-            html_content = template_service.render_template('hours_denied', **template_data)
+            html_content, text_content = template_service.render_cached('hours_denied', volatile=('verification_date',), **template_data)
             subject = f"Volunteer Hours Update - {template_data['student_name']}"
         
         # Send email
-        success = email_service.send_email(student_email, subject, html_content)
+        delivery = email_service.send_email(student_email, subject, html_content, text_content, template=f'student_{status}_notification')
         
-        if success:
+        if delivery:
             # Log email sent
             supabase_service.log_email_sent(
                 recipient=student_email,
@@ -515,7 +859,8 @@ def send_notification():
                     'status': status,
                     'verifier_email': verifier_email,
                     'notes': notes
-                }
+                },
+                status=delivery
             )
             
             return jsonify({
@@ -574,18 +919,19 @@ def send_opportunity_registration():
         }
         
         # Render and send email
-        html_content = template_service.render_template('opportunity_registration', **template_data)
+        html_content, text_content = template_service.render('opportunity_registration', **template_data)
         subject = f"Registration Confirmed - {template_data['opportunity_title']}"
         
-        success = email_service.send_email(student_email, subject, html_content)
+        delivery = email_service.send_email(student_email, subject, html_content, text_content, template='opportunity_registration')
         
-        if success:
+        if delivery:
             # Log email sent
             supabase_service.log_email_sent(
                 recipient=student_email,
                 template='opportunity_registration',
                 subject=subject,
-                data=template_data
+                data=template_data,
+                status=delivery
             )
             
             return jsonify({
@@ -649,18 +995,19 @@ def send_opportunity_reminder():
         }
         
         # Render and send email
-        html_content = template_service.render_template('opportunity_reminder', **template_data)
+        html_content, text_content = template_service.render('opportunity_reminder', **template_data)
         subject = f"Reminder: {template_data['opportunity_title']} in {days_until} days"
         
-        success = email_service.send_email(student_email, subject, html_content)
+        delivery = email_service.send_email(student_email, subject, html_content, text_content, template='opportunity_reminder')
         
-        if success:
+        if delivery:
             # Log email sent
             supabase_service.log_email_sent(
                 recipient=student_email,
                 template='opportunity_reminder',
                 subject=subject,
-                data=template_data
+                data=template_data,
+                status=delivery
             )
             
             return jsonify({
@@ -718,18 +1065,19 @@ def send_opportunity_unregistration():
         }
         
         # Render and send email
-        html_content = template_service.render_template('opportunity_unregistration', **template_data)
+        html_content, text_content = template_service.render('opportunity_unregistration', **template_data)
         subject = f"Unregistration Confirmed - {template_data['opportunity_title']}"
         
-        success = email_service.send_email(student_email, subject, html_content)
+        delivery = email_service.send_email(student_email, subject, html_content, text_content, template='opportunity_unregistration')
         
-        if success:
+        if delivery:
             # Log email sent
             supabase_service.log_email_sent(
                 recipient=student_email,
                 template='opportunity_unregistration',
                 subject=subject,
-                data=template_data
+                data=template_data,
+                status=delivery
             )
             
             return jsonify({
@@ -763,18 +1111,15 @@ def send_hours_notification():
         admin_id = data['admin_id']
         notes = data.get('notes', '')
         
-        # Get hours data
-        hours_data = supabase_service.get_hours_by_id(hours_id)
+        # Get hours (with the student's profile) and the admin's profile concurrently
+        (hours_data, student_profile), admin_profile = supabase_service.gather(
+            supabase_service.aio.get_hours_with_student(hours_id),
+            supabase_service.aio.get_admin_profile(admin_id)
+        )
         if not hours_data:
             return jsonify({'error': 'Hours record not found'}), 404
-        
-        # Get student profile
-        student_profile = supabase_service.get_student_profile(hours_data['student_id'])
         if not student_profile:
             return jsonify({'error': 'Student profile not found'}), 404
-        
-        # Get admin profile
-        admin_profile = supabase_service.get_admin_profile(admin_id)
         if not admin_profile:
             return jsonify({'error': 'Admin profile not found'}), 404
         
@@ -795,34 +1140,35 @@ def send_hours_notification():
         }
         
         if status == 'approved':
-            html_content = template_service.render_template('hours_approved', **template_data)
+            html_content, text_content = template_service.render_cached('hours_approved', volatile=('verification_date',), **template_data)
             subject = f"Your Volunteer Hours Have Been Approved! - {template_data['student_name']}"
         else:
-            html_content = template_service.render_template('hours_denied', **template_data)
+            html_content, text_content = template_service.render_cached('hours_denied', volatile=('verification_date',), **template_data)
             subject = f"Volunteer Hours Update - {template_data['student_name']}"
         
         # Send email
-        success = email_service.send_email(student_email, subject, html_content)
-        
-        if success:
-            # Log email sent
-            supabase_service.log_email_sent(
-                recipient=student_email,
-                template=f'hours_{status}',
-                subject=subject,
-                data=template_data
-            )
-            
-            # Log admin activity
-            supabase_service.log_admin_activity(
-                admin_id=admin_id,
-                action=f'hours_{status}',
-                details={
-                    'hours_id': hours_id,
-                    'student_id': hours_data['student_id'],
-                    'student_email': student_email,
-                    'notes': notes
-                }
+        delivery = email_service.send_email(student_email, subject, html_content, text_content, template=f'hours_{status}')
+        
+        if delivery:
+            # Log the email and the admin activity concurrently
+            supabase_service.gather(
+                supabase_service.aio.log_email_sent(
+                    recipient=student_email,
+                    template=f'hours_{status}',
+                    subject=subject,
+                    data=template_data,
+                    status=delivery
+                ),
+                supabase_service.aio.log_admin_activity(
+                    admin_id=admin_id,
+                    action=f'hours_{status}',
+                    details={
+                        'hours_id': hours_id,
+                        'student_id': hours_data['student_id'],
+                        'student_email': student_email,
+                        'notes': notes
+                    }
+                )
             )
             
             return jsonify({
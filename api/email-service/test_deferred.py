@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for over-budget sends: they are queued durably, logged as queued and delivered later
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import flask_app
+from flask_app import DeferredSendQueue, EMAIL_QUEUED
+
+from email_common import create_outbox_store, SendRateLimiter
+
+def record_logs(monkeypatch):
+    logs = []
+    monkeypatch.setattr(flask_app.supabase_service, 'log_email_sent', lambda **kwargs: logs.append(kwargs))
+    return logs
+
+def test_over_budget_send_is_queued_and_logged_as_queued(monkeypatch, tmp_path):
+    url = f"sqlite:///{tmp_path / 'deferred.db'}"
+    monkeypatch.setattr(flask_app.email_service, 'deferred', DeferredSendQueue(flask_app.email_service.deliver, url=url))
+    # A one-email daily budget that is already spent
+    limiter = SendRateLimiter(per_second=0, burst=0, per_day=1)
+    limiter.acquire()
+    monkeypatch.setattr(flask_app, 'send_limiter', limiter)
+    monkeypatch.setattr(flask_app.supabase_service, 'get_registration_by_id', lambda registration_id: {
+        'id': registration_id, 'opportunity_id': 'opportunity-1', 'student_id': 'student-1'
+    })
+    monkeypatch.setattr(flask_app.supabase_service, 'get_opportunity_by_id', lambda opportunity_id: {
+        'id': opportunity_id, 'title': 'Beach Cleanup'
+    })
+    monkeypatch.setattr(flask_app.supabase_service, 'get_student_profile', lambda student_id: {'full_name': 'Sam'})
+    logs = record_logs(monkeypatch)
+
+    response = flask_app.app.test_client().post('/send-opportunity-registration', json={
+        'registration_id': 'registration-1', 'student_email': 'sam@test.local'
+    })
+
+    assert response.status_code == 200
+    assert [log['status'] for log in logs] == [EMAIL_QUEUED]
+    # The queued email lives in the store, not in this process
+    assert create_outbox_store(url).counts() == {'queued': 1}
+
+def test_deferred_email_is_delivered_once_the_budget_frees_up(monkeypatch, tmp_path):
+    delivered = []
+    queue = DeferredSendQueue(lambda **email: delivered.append(email) or True,
+                              url=f"sqlite:///{tmp_path / 'deferred.db'}", poll_interval=0.05)
+    monkeypatch.setattr(flask_app, 'send_limiter', SendRateLimiter(0, 0, 0))
+    logs = record_logs(monkeypatch)
+    email = {'to_email': 'sam@test.local', 'subject': 'Hi', 'html_content': '<p>Hi</p>',
+             'text_content': 'Hi', 'template': 'opportunity_reminder'}
+
+    queue.defer(0, email)
+    for _ in range(100):
+        if queue.store.counts().get('sent'):
+            break
+        time.sleep(0.05)
+
+    assert delivered == [email]
+    assert queue.store.counts() == {'sent': 1}
+    assert [log['recipient'] for log in logs] == ['sam@test.local']
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Tests for TemplateService: a template that fails to render raises instead of yielding a blank email,
+and batch rendering matches rendering one email at a time
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_app import TemplateService
+
+def test_render_errors_propagate_and_are_not_cached():
+    template_service = TemplateService()
+    with pytest.raises(Exception):
+        template_service.render_cached('no_such_template', student_name='Sam')
+    with pytest.raises(Exception):
+        template_service.render_text('no_such_template', student_name='Sam')
+    assert template_service.cache.stats()['size'] == 0
+
+    html, text = template_service.render_cached('opportunity_reminder', student_name='Sam')
+    assert 'Sam' in html and 'Sam' in text
+    assert template_service.cache.stats()['size'] == 1
+
+def test_render_many_matches_render_for_every_context():
+    template_service = TemplateService()
+    contexts = [{'student_name': name, 'title': 'Beach Cleanup'} for name in ('Sam', 'Alex', 'Jordan')]
+
+    rendered = list(template_service.render_many('opportunity_reminder', contexts))
+
+    assert rendered == [template_service.render('opportunity_reminder', **context) for context in contexts]
+    assert 'Alex' in rendered[1][0] and 'Alex' in rendered[1][1]
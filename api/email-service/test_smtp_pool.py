@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Tests for SMTPConnectionPool: waiting for a free connection never outlasts the request deadline
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_app import SMTPConnectionPool
+
+import email_common
+from email_common import Deadline, DeadlineExceeded, run_with_deadline
+
+def borrow(pool):
+    with pool.connection():
+        pass
+
+def test_waiting_for_a_busy_pool_stops_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(email_common, 'STAGE_RESERVES', {})
+    pool = SMTPConnectionPool('127.0.0.1', 25, 'sender@test.local', 'test', size=1)
+    # Another send holds the only connection
+    pool._slots.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        run_with_deadline(Deadline(0.2), borrow, pool)
+    assert time.monotonic() - started < 1
+    assert pool.stats()['slot_timeouts'] == 1
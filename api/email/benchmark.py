@@ -0,0 +1,613 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the email API.
+
+Boots a local SMTP sink and a fake PostgREST server, points flask_app at them
+and drives every /api/email/* route at a configurable concurrency. Reports
+throughput plus p50/p95/p99 latency per route and per stage (fetch, render,
+send, log) and writes the results as JSON for regression comparison.
+
+Usage:
+    python benchmark.py --requests 100 --concurrency 8 --output results.json
+    python benchmark.py --smtp-latency 40 --db-latency 15 --compare baseline.json
+    python benchmark.py --routes send-verification-email,opportunity-fanout
+"""
+
+import argparse
+import json
+import os
+import platform
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+SEED_STUDENTS = 50
+SEED_REGISTRANTS = 40
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = (len(values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+def summarize(samples: List[float], elapsed: Optional[float] = None) -> Dict[str, Any]:
+    """Latency summary in milliseconds, with throughput when a wall time is given"""
+    ordered = sorted(samples)
+    summary = {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0
+    }
+    if elapsed:
+        summary['throughput_rps'] = round(len(ordered) / elapsed, 2)
+    return summary
+
+# ---------------------------------------------------------------------------
+# SMTP sink
+# ---------------------------------------------------------------------------
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Minimal ESMTP dialogue: accepts AUTH PLAIN and swallows every message"""
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        sink = self.server
+        with sink.lock:
+            sink.stats['connections'] += 1
+        self.reply('220 benchmark-sink ESMTP')
+        recipients = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250-benchmark-sink')
+                self.reply('250-AUTH PLAIN')
+                self.reply('250 SIZE 35882577')
+            elif verb == 'AUTH':
+                self.reply('235 2.7.0 Authentication successful')
+            elif verb == 'MAIL':
+                recipients = 0
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients += 1
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b'.\r\n', b'.\n'):
+                        break
+                    size += len(chunk)
+                if sink.latency:
+                    time.sleep(sink.latency)
+                with sink.lock:
+                    sink.stats['messages'] += 1
+                    sink.stats['recipients'] += recipients
+                    sink.stats['bytes'] += size
+                self.reply('250 OK queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(('127.0.0.1', 0), SMTPSinkHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.stats = {'connections': 0, 'messages': 0, 'recipients': 0, 'bytes': 0}
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+# ---------------------------------------------------------------------------
+# Fake PostgREST
+# ---------------------------------------------------------------------------
+
+def seed_tables() -> Dict[str, List[Dict[str, Any]]]:
+    """Rows for every table the email API reads or writes"""
+    profiles = [{
+        'id': f'student-{i}',
+        'full_name': f'Student {i}',
+        'email': f'student{i}@bench.local',
+        'student_id': f'S{i:05d}',
+        'role': 'student'
+    } for i in range(SEED_STUDENTS)]
+    profiles.append({
+        'id': 'admin-0',
+        'full_name': 'Bench Admin',
+        'email': 'admin@bench.local',
+        'role': 'admin'
+    })
+    hours = [{
+        'id': f'hours-{i}',
+        'student_id': f'student-{i}',
+        'hours': 2 + i % 5,
+        'date': '2026-09-01',
+        'description': f'Food bank shift {i}',
+        'status': 'pending',
+        'created_at': '2026-09-02T10:00:00'
+    } for i in range(SEED_STUDENTS)]
+    registrations = [{
+        'id': f'registration-{i}',
+        'status': 'registered',
+        'profiles': {'full_name': profiles[i]['full_name'], 'email': profiles[i]['email']}
+    } for i in range(min(SEED_REGISTRANTS, SEED_STUDENTS))]
+    opportunities = [{
+        'id': 'opportunity-0',
+        'title': 'Park Cleanup',
+        'location': 'Central Park',
+        'date': '2026-10-30',
+        'start_time': '09:00',
+        'end_time': '12:00',
+        'opportunity_registrations': registrations
+    }]
+    return {
+        'profiles': profiles,
+        'volunteer_hours': hours,
+        'volunteer_opportunities': opportunities,
+        'email_logs': [],
+        'admin_activity_logs': []
+    }
+
+class PostgRESTHandler(BaseHTTPRequestHandler):
+    """Serves /rest/v1/<table> with eq. filters, select embeds, single-object reads, limit, inserts and patches"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without this, keep-alive clients
+    # stall on Nagle + delayed ACK and reused connections look 40ms slower than new ones
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: Any = None):
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def parse(self):
+        parts = urlsplit(self.path)
+        table = parts.path[len('/rest/v1/'):].strip('/') if parts.path.startswith('/rest/v1') else None
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        return table, params
+
+    def matching(self, rows: List[Dict[str, Any]], params: Dict[str, str]) -> List[Dict[str, Any]]:
+        for key, value in params.items():
+            if key in ('select', 'order', 'limit', 'offset') or not value.startswith('eq.'):
+                continue
+            rows = [row for row in rows if str(row.get(key)) == value[3:]]
+        if 'limit' in params:
+            rows = rows[:int(params['limit'])]
+        return rows
+
+    def project(self, rows: List[Dict[str, Any]], select: Optional[str]) -> List[Dict[str, Any]]:
+        """Apply a select= projection, resolving `table!fk(columns)` embeds against seeded rows"""
+        if not select:
+            return rows
+        fields, depth, start = [], 0, 0
+        for index, char in enumerate(select + ','):
+            depth += {'(': 1, ')': -1}.get(char, 0)
+            if char == ',' and depth == 0:
+                fields.append(select[start:index].strip())
+                start = index + 1
+        projected = []
+        for row in rows:
+            item: Dict[str, Any] = {}
+            for field in fields:
+                if field == '*':
+                    item.update(row)
+                elif '(' in field:
+                    name, columns = field[:-1].split('(', 1)
+                    name, _, foreign_key = name.partition('!')
+                    if name in row:
+                        item[name] = row[name]
+                        continue
+                    target = next((other for other in self.server.tables.get(name, [])
+                                   if other.get('id') == row.get(foreign_key)), None)
+                    item[name] = self.project([target], columns)[0] if target else None
+                else:
+                    item[field] = row.get(field)
+            projected.append(item)
+        return projected
+
+    def read_body(self) -> Any:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'null')
+
+    def dispatch(self, method: str):
+        server = self.server
+        table, params = self.parse()
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            server.stats[f'{method} {table or "/"}'] = server.stats.get(f'{method} {table or "/"}', 0) + 1
+        if not table:
+            return self.send_json(200, {'swagger': '2.0'})
+        if table not in server.tables:
+            return self.send_json(404, {'message': f'relation "{table}" does not exist'})
+
+        if method == 'GET':
+            with server.lock:
+                rows = self.project(self.matching(server.tables[table], params), params.get('select'))
+            if 'vnd.pgrst.object' in (self.headers.get('Accept') or ''):
+                if len(rows) != 1:
+                    return self.send_json(406, {'code': 'PGRST116', 'message': 'JSON object requested, multiple (or no) rows returned'})
+                return self.send_json(200, rows[0])
+            return self.send_json(200, rows)
+        body = self.read_body()
+        if method == 'POST':
+            rows = body if isinstance(body, list) else [body]
+            with server.lock:
+                for row in rows:
+                    row.setdefault('id', len(server.tables[table]) + 1)
+                    server.tables[table].append(row)
+            if 'return=representation' in (self.headers.get('Prefer') or ''):
+                return self.send_json(201, rows)
+            return self.send_json(201)
+        with server.lock:
+            rows = self.matching(server.tables[table], params)
+            for row in rows:
+                row.update(body or {})
+        if 'return=representation' in (self.headers.get('Prefer') or ''):
+            return self.send_json(200, rows)
+        return self.send_json(204)
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+class FakePostgREST(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(('127.0.0.1', 0), PostgRESTHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.tables = seed_tables()
+        self.stats: Dict[str, int] = {}
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+# ---------------------------------------------------------------------------
+# Stage instrumentation
+# ---------------------------------------------------------------------------
+
+class StageRecorder:
+    """Times the fetch/render/send/log stages of every request, keyed by route rule"""
+
+    SUPABASE_STAGES = {'get_': 'fetch', 'gather': 'fetch', 'update_': 'update', 'log_': 'log', 'mark_': 'log'}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: Dict[str, Dict[str, List[float]]] = {}
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        from flask import g, has_request_context
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if has_request_context():
+                    stages = g.setdefault('benchmark_stages', {})
+                    stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - start
+        return timed
+
+    def flush(self, exc=None):
+        from flask import g, request
+
+        stages = g.pop('benchmark_stages', None)
+        if not stages or request.url_rule is None:
+            return
+        with self.lock:
+            route = self.samples.setdefault(request.url_rule.rule, {})
+            for stage, elapsed in stages.items():
+                route.setdefault(stage, []).append(elapsed)
+
+    def install(self, module):
+        """Wrap the module's stage boundaries in place"""
+        service = module.supabase_service
+        for name in dir(type(service)):
+            for prefix, stage in self.SUPABASE_STAGES.items():
+                if name.startswith(prefix):
+                    setattr(service, name, self.wrap(stage, getattr(service, name)))
+        module.render_email = self.wrap('render', module.render_email)
+        module.send_batch = self.wrap('send', module.send_batch)
+        module.mail_dispatcher.send = self.wrap('send', module.mail_dispatcher.send)
+        module.app.teardown_request(self.flush)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            return {route: {stage: summarize(samples) for stage, samples in stages.items()}
+                    for route, stages in self.samples.items()}
+
+# ---------------------------------------------------------------------------
+# Workload
+# ---------------------------------------------------------------------------
+
+def build_scenarios(module) -> Dict[str, Callable[[int], Dict[str, Any]]]:
+    """One request factory per /api/email/* route, keyed by route rule"""
+    def student(i):
+        return i % SEED_STUDENTS
+
+    def verify_hours(i):
+        hours_id, email = f'hours-{student(i)}', f'verifier{i}@bench.local'
+        token = module.generate_verification_token(hours_id, 'approve', email)
+        return {'method': 'GET', 'params': {'token': token, 'action': 'approve', 'hours_id': hours_id, 'email': email}}
+
+    def opportunity(i):
+        return {'method': 'POST', 'json': {
+            'student_email': f'student{student(i)}@bench.local',
+            'student_name': f'Student {student(i)}',
+            'title': 'Park Cleanup',
+            'organization': 'Parks Department',
+            'location': 'Central Park',
+            'date': '2026-10-30',
+            'time': '09:00',
+            'duration': '3 hours'
+        }}
+
+    return {
+        '/api/email/send-verification-email': lambda i: {'method': 'POST', 'json': {
+            'hours_id': f'hours-{student(i)}',
+            'verifier_email': f'verifier{i}@bench.local',
+            'student_id': f'student-{student(i)}'
+        }},
+        '/api/email/verify-hours': verify_hours,
+        '/api/email/test': lambda i: {'method': 'GET'},
+        '/api/email/test-send': lambda i: {'method': 'POST', 'json': {'email': f'tester{i}@bench.local'}},
+        '/api/email/opportunity-confirmation': opportunity,
+        '/api/email/opportunity-reminder': opportunity,
+        '/api/email/opportunity-cancellation': opportunity,
+        '/api/email/opportunity-fanout': lambda i: {'method': 'POST', 'json': {
+            'opportunity_id': 'opportunity-0',
+            'kind': 'reminder' if i % 2 else 'cancellation'
+        }},
+        '/api/email/hours-update-notification': lambda i: {'method': 'POST', 'json': {
+            'hours_id': f'hours-{student(i)}',
+            'verifier_email': f'verifier{i}@bench.local',
+            'status': 'approved' if i % 2 else 'denied',
+            'notes': 'Benchmark run'
+        }},
+        '/api/email/send-hours-notification': lambda i: {'method': 'POST', 'json': {
+            'hours_id': f'hours-{student(i)}',
+            'student_email': f'student{student(i)}@bench.local',
+            'status': 'approved' if i % 2 else 'denied',
+            'admin_id': 'admin-0'
+        }},
+        '/api/email/send-profile-share': lambda i: {'method': 'POST', 'json': {
+            'student_name': f'Student {student(i)}',
+            'student_email': f'student{student(i)}@bench.local',
+            'share_url': f'http://localhost:3000/profile/student-{student(i)}',
+            'recipient_email': f'recruiter{i}@bench.local',
+            'custom_message': 'Please take a look at my volunteer record.'
+        }},
+        '/api/email/outbox/<message_id>': lambda i: {'method': 'GET', 'path': f'/api/email/outbox/{uuid.uuid4()}'},
+        '/api/email/health': lambda i: {'method': 'GET'}
+    }
+
+# Routes whose 404 is the expected answer for the generated request
+EXPECTED_STATUS = {'/api/email/outbox/<message_id>': (200, 404)}
+
+def run_route(base_url: str, rule: str, factory: Callable[[int], Dict[str, Any]],
+              total: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    """Fire `total` requests at one route and summarize client-side latency"""
+    local = threading.local()
+    expected = EXPECTED_STATUS.get(rule, (200, 202))
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def call(i: int) -> Optional[float]:
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        spec = factory(i)
+        start = time.perf_counter()
+        try:
+            response = session.request(spec['method'], base_url + spec.get('path', rule),
+                                        json=spec.get('json'), params=spec.get('params'), timeout=60)
+            response.content
+            elapsed = time.perf_counter() - start
+            if response.status_code in expected:
+                return elapsed
+            error = f'HTTP {response.status_code}'
+        except Exception as e:
+            error = type(e).__name__
+        with lock:
+            errors[error] = errors.get(error, 0) + 1
+        return None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(-warmup, 0)))
+        start = time.perf_counter()
+        latencies = list(pool.map(call, range(total)))
+        elapsed = time.perf_counter() - start
+
+    summary = summarize([latency for latency in latencies if latency is not None], elapsed)
+    summary['errors'] = errors
+    summary['elapsed_s'] = round(elapsed, 3)
+    return summary
+
+# ---------------------------------------------------------------------------
+# Harness
+# ---------------------------------------------------------------------------
+
+def configure_environment(smtp: SMTPSink, postgrest: FakePostgREST, args) -> None:
+    """Point flask_app at the stand-ins; explicit environment still wins for tuning knobs"""
+    os.environ.update({
+        'FLASK_MAIL_SERVER': '127.0.0.1',
+        'FLASK_MAIL_PORT': str(smtp.port),
+        'FLASK_MAIL_USE_TLS': 'false',
+        'FLASK_MAIL_USERNAME': 'sender@bench.local',
+        'FLASK_MAIL_PASSWORD': 'benchmark',
+        'NEXT_PUBLIC_SUPABASE_URL': postgrest.url,
+        'SUPABASE_URL': postgrest.url,
+        'SUPABASE_SERVICE_ROLE_KEY': 'benchmark-service-key'
+    })
+    # Unflushed email log rows must never be recovered by a later run against the real database
+    os.environ['EMAIL_LOG_SPILL_DIR'] = tempfile.mkdtemp()
+    # The real send budget would throttle the run to a few messages per second
+    os.environ.setdefault('SMTP_RATE_PER_SECOND', '1000000')
+    os.environ.setdefault('SMTP_RATE_BURST', '1000000')
+    os.environ.setdefault('SMTP_RATE_PER_DAY', '1000000000')
+    if args.outbox:
+        os.environ['EMAIL_OUTBOX_ENABLED'] = 'true'
+        os.environ['EMAIL_OUTBOX_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'outbox.db')}"
+
+def load_app():
+    """Import flask_app from this directory with the benchmark environment applied"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import flask_app
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+    flask_app.logger.setLevel(logging.WARNING)
+    return flask_app
+
+def start_thread(server) -> threading.Thread:
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print per-route p50/p95 and throughput deltas against an earlier run"""
+    print(f"\n{'route':<45} {'p50 ms':>18} {'p95 ms':>18} {'rps':>18}")
+    for rule, current in results['routes'].items():
+        before = baseline.get('routes', {}).get(rule)
+        if not before:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'throughput_rps'):
+            old, new = before.get(key, 0), current.get(key, 0)
+            change = f"{(new - old) / old * 100:+.0f}%" if old else 'n/a'
+            cells.append(f"{old:>7.1f}->{new:<7.1f}{change:>4}")
+        print(f"{rule:<45} " + ' '.join(f"{cell:>18}" for cell in cells))
+
+def print_report(results: Dict[str, Any]) -> None:
+    print(f"\n{'route':<45} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for rule, summary in results['routes'].items():
+        print(f"{rule:<45} {summary.get('throughput_rps', 0):>8.1f} {summary['p50_ms']:>8.1f} "
+              f"{summary['p95_ms']:>8.1f} {summary['p99_ms']:>8.1f} {sum(summary['errors'].values()):>7}")
+        for stage, stats in sorted(results['stages'].get(rule, {}).items()):
+            print(f"  {stage:<43} {'':>8} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+    smtp = results['smtp']
+    print(f"\nSMTP sink: {smtp['messages']} messages, {smtp['recipients']} recipients, "
+          f"{smtp['connections']} connections")
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the email API against local SMTP and PostgREST stand-ins')
+    parser.add_argument('--requests', type=int, default=50, help='measured requests per route')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent client connections')
+    parser.add_argument('--warmup', type=int, default=2, help='unmeasured requests per route before timing')
+    parser.add_argument('--routes', help='comma-separated route names to run (default: all)')
+    parser.add_argument('--smtp-latency', type=float, default=0.0, help='simulated SMTP DATA latency in ms')
+    parser.add_argument('--db-latency', type=float, default=0.0, help='simulated PostgREST latency in ms')
+    parser.add_argument('--outbox', action='store_true', help='enable the email outbox (202 responses)')
+    parser.add_argument('--output', default='benchmark_results.json', help='where to write JSON results')
+    parser.add_argument('--compare', help='earlier results JSON to diff against')
+    args = parser.parse_args(argv)
+
+    smtp = SMTPSink(latency=args.smtp_latency / 1000)
+    postgrest = FakePostgREST(latency=args.db_latency / 1000)
+    start_thread(smtp)
+    start_thread(postgrest)
+    configure_environment(smtp, postgrest, args)
+
+    module = load_app()
+    recorder = StageRecorder()
+    recorder.install(module)
+
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, module.app, threaded=True)
+    start_thread(server)
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    scenarios = build_scenarios(module)
+    if args.routes:
+        wanted = [name.strip() for name in args.routes.split(',')]
+        scenarios = {rule: factory for rule, factory in scenarios.items()
+                     if any(name in rule for name in wanted)}
+
+    routes = {}
+    for rule, factory in scenarios.items():
+        print(f"Benchmarking {rule} ...", flush=True)
+        routes[rule] = run_route(base_url, rule, factory, args.requests, args.concurrency, args.warmup)
+
+    # Write out buffered email logs while the fake PostgREST is still up
+    module.supabase_service.log_buffer.flush()
+
+    results = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'requests_per_route': args.requests,
+            'concurrency': args.concurrency,
+            'warmup': args.warmup,
+            'smtp_latency_ms': args.smtp_latency,
+            'db_latency_ms': args.db_latency,
+            'outbox': args.outbox
+        },
+        'routes': routes,
+        'stages': recorder.report(),
+        'smtp': dict(smtp.stats),
+        'postgrest': dict(sorted(postgrest.stats.items()))
+    }
+
+    server.shutdown()
+    smtp.shutdown()
+    postgrest.shutdown()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print_report(results)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+    failed = sum(sum(summary['errors'].values()) for summary in routes.values())
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,23 +1,47 @@
-from flask import Flask, request, jsonify, render_template, render_template_string
+from flask import Flask, Response, request, jsonify, render_template, render_template_string, stream_with_context
 from flask_mail import Mail, Message
 from flask_cors import CORS
 import os
+import sys
 import uuid
 import requests
 import hashlib
 import hmac
+import atexit
 import json
+import click
+import difflib
 import logging
+import multiprocessing
+import re
+import smtplib
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+from jinja2 import BaseLoader, ChoiceLoader, DictLoader, TemplateNotFound, TemplateSyntaxError, meta
 from premailer import transform
 
+# Code shared with the other email service lives in api/shared
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared'))
+from email_common import (
+    AsyncSupabaseClient, check_deadline, CircuitBreaker, current_deadline, Deadline, DeadlineExceeded,
+    html_to_text, init_request_deadlines, is_transient_smtp_error, protect_jinja_tags, RenderedEmailCache,
+    create_outbox_store, OutboxStore, REQUEST_DEADLINE, restore_jinja_tags, retry_delay, run_with_deadline, SendRateLimiter,
+    SMTP_RETRY_ATTEMPTS, SMTP_TIMEOUT, STAGE_RESERVES, stage_timeout, SupabaseClient,
+    TextSkeletonLoader, tidy_text
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__, static_folder='../../public', static_url_path='')
 CORS(app)
+init_request_deadlines(app)
 
 # Configuration - Properly access Vercel environment variables
 app.config['MAIL_SERVER'] = os.getenv('FLASK_MAIL_SERVER', 'smtp.gmail.com')
@@ -52,11 +76,78 @@ logger.info(f"  LOGO_URL: {'set' if os.getenv('LOGO_URL') else f'not set (using
 
 mail = Mail(app)
 
-# Template rendering with CSS inlining
-def render_email(template_name: str, **context) -> str:
-    # Add dashboard URL to all templates
-    context['dashboard_url'] = FRONTEND_URL
-    
+# How render_email applies CSS: 'preinlined' (inlined once per template), 'transform'
+# (premailer on every email) or 'verify' (both, logging any difference)
+EMAIL_CSS_MODE = os.getenv('EMAIL_CSS_MODE', 'preinlined').lower()
+
+EXTENDS_TAG = re.compile(r'''{%-?\s*extends\s+['"]([^'"]+)['"]\s*-?%}''')
+BLOCK_TAG = re.compile(r'{%-?\s*block\s+(\w+)\s*-?%}(.*?){%-?\s*endblock(?:\s+\w+)?\s*-?%}', re.S)
+HTML_START = re.compile(r'<!DOCTYPE|<html', re.I)
+def inline_template_css(source: str) -> str:
+    """Inline the stylesheet of a Jinja template source without rendering it.
+
+    premailer only sees static markup with placeholders in place of Jinja
+    tags. Statements ahead of the document (e.g. {% set subject %}) are kept
+    outside the HTML premailer parses.
+    """
+    start = HTML_START.search(source)
+    prelude, document = (source[:start.start()], source[start.start():]) if start else ('', source)
+    protected, tags = protect_jinja_tags(document)
+    return prelude + restore_jinja_tags(transform(protected, remove_classes=False), tags)
+
+class InlinedTemplateLoader(BaseLoader):
+    """Serves templates flattened into their layout with CSS already inlined.
+
+    premailer needs the whole document to resolve styles, so a child's blocks
+    are substituted into its parent first. The result is compiled and cached
+    like any other template, leaving only variable substitution per email.
+    A template is rebuilt when it or its layout changes.
+    """
+
+    def __init__(self, loader: BaseLoader):
+        self.loader = loader
+
+    def flatten(self, environment, template: str):
+        source, filename, uptodate = self.loader.get_source(environment, template)
+        extends = EXTENDS_TAG.search(source)
+        if not extends:
+            return source, filename, [uptodate]
+        parent, _, parent_uptodate = self.flatten(environment, extends.group(1))
+        blocks = {name: body for name, body in BLOCK_TAG.findall(source)}
+        prelude = ''.join(line.strip() for line in BLOCK_TAG.sub('', EXTENDS_TAG.sub('', source)).splitlines())
+        body = BLOCK_TAG.sub(lambda m: blocks.get(m.group(1), m.group(2)), parent)
+        return f"{prelude}\n{body}" if prelude else body, filename, [uptodate] + parent_uptodate
+
+    def get_source(self, environment, template):
+        source, filename, checks = self.flatten(environment, template)
+        return inline_template_css(source), filename, lambda: all(check() for check in checks if check)
+
+    def list_templates(self):
+        return self.loader.list_templates()
+
+# Templates defined in code, served by name alongside the files in templates/
+INLINE_TEMPLATES: Dict[str, str] = {}
+app.jinja_env.loader = ChoiceLoader([app.jinja_env.loader, DictLoader(INLINE_TEMPLATES)])
+inlined_env = app.jinja_env.overlay(loader=InlinedTemplateLoader(app.jinja_env.loader))
+text_env = app.jinja_env.overlay(loader=TextSkeletonLoader(app.jinja_env.loader), autoescape=False)
+
+def register_template(name: str, source: str) -> str:
+    """Register an in-code template under a name and compile it now rather than per request"""
+    INLINE_TEMPLATES[name] = source
+    inlined_env.get_template(name)
+    text_env.get_template(name)
+    return name
+
+def normalize_html(html: str) -> List[str]:
+    return [line.strip() for line in re.sub(r'>\s*<', '>\n<', html).splitlines() if line.strip()]
+
+def diff_inlined(template_name: str, preinlined: str, transformed: str) -> List[str]:
+    """Unified diff between the pre-inlined and per-email premailer output"""
+    return list(difflib.unified_diff(normalize_html(transformed), normalize_html(preinlined),
+                                     f'{template_name} (transform)', f'{template_name} (preinlined)', lineterm=''))
+
+def render_transformed(template_name: str, **context) -> str:
+    """Render, then inline CSS with premailer - the original per-email path"""
     try:
         html = render_template(template_name, **context)
     except Exception:
@@ -68,131 +159,635 @@ def render_email(template_name: str, **context) -> str:
     except Exception:
         return html
 
-class SupabaseService:
-    def __init__(self):
-        self.url = SUPABASE_URL
-        self.service_key = SUPABASE_SERVICE_KEY
-        self.headers = {
-            'apikey': self.service_key,
-            'Authorization': f'Bearer {self.service_key}',
-            'Content-Type': 'application/json'
-        }
+# Template rendering with CSS inlining
+def render_email(template_name: str, **context) -> str:
+    # Add dashboard URL to all templates
+    context['dashboard_url'] = FRONTEND_URL
     
-    def get_hours_by_id(self, hours_id: str) -> Optional[Dict[str, Any]]:
-        """Get volunteer hours by ID"""
+    if EMAIL_CSS_MODE == 'transform':
+        return render_transformed(template_name, **context)
+    try:
+        html = inlined_env.get_template(template_name).render(**context)
+    except TemplateNotFound:
+        return render_transformed(template_name, **context)
+    if EMAIL_CSS_MODE == 'verify':
+        transformed = render_transformed(template_name, **context)
+        diff = diff_inlined(template_name, html, transformed)
+        if diff:
+            logger.warning(f"Pre-inlined output differs for {template_name}:\n" + '\n'.join(diff[:40]))
+        return transformed
+    return html
+
+def render_email_text(template_name: str, **context) -> str:
+    """Render the text/plain alternative from the template's cached text skeleton"""
+    context['dashboard_url'] = FRONTEND_URL
+    try:
+        return tidy_text(text_env.get_template(template_name).render(**context))
+    except TemplateNotFound:
+        return html_to_text(render_template_string(template_name, **context))
+
+def render_parts_in_process(template_name: str, context: Dict[str, Any]) -> Tuple[str, str]:
+    return render_email(template_name, **context), render_email_text(template_name, **context)
+
+def render_email_parts(template_name: str, **context) -> Tuple[str, str]:
+    """Render the HTML body and its plain-text alternative"""
+    check_deadline('render')
+    if render_pool.enabled:
+        return render_pool.render(template_name, context)
+    return render_parts_in_process(template_name, context)
+
+def render_many(template_name: str, contexts: Iterable[Dict[str, Any]]) -> Iterator[Tuple[str, str]]:
+    """Render one template for many contexts, yielding (html, text) per context.
+
+    The compiled pre-inlined template and its text skeleton are looked up
+    once for the whole batch rather than once per email.
+    """
+    check_deadline('render')
+    if render_pool.enabled:
+        yield from render_pool.render_many(template_name, contexts)
+        return
+    yield from render_many_in_process(template_name, contexts)
+
+def render_many_in_process(template_name: str, contexts: Iterable[Dict[str, Any]]) -> Iterator[Tuple[str, str]]:
+    if EMAIL_CSS_MODE != 'preinlined':
+        for context in contexts:
+            yield render_email_parts(template_name, **context)
+        return
+    html_template = inlined_env.get_template(template_name)
+    text_template = text_env.get_template(template_name)
+    for context in contexts:
+        context = {**context, 'dashboard_url': FRONTEND_URL}
+        yield html_template.render(context), tidy_text(text_template.render(context))
+
+# Optional process pool for rendering - CPU-bound work (premailer above all) holds the GIL,
+# so concurrent requests serialize behind it in a threaded server. 0 renders in-process.
+EMAIL_RENDER_PROCESSES = int(os.getenv('EMAIL_RENDER_PROCESSES', '0'))
+EMAIL_RENDER_START_METHOD = os.getenv('EMAIL_RENDER_START_METHOD', 'spawn')
+EMAIL_RENDER_TIMEOUT = float(os.getenv('EMAIL_RENDER_TIMEOUT', '10'))
+
+def warm_render_worker():
+    """Compile every template in a new render process before it takes jobs"""
+    for name in app.jinja_env.loader.list_templates():
         try:
-            response = requests.get(
-                f"{self.url}/rest/v1/volunteer_hours?id=eq.{hours_id}",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data[0] if data else None
-        except Exception as e:
-            logger.error(f"Failed to get hours: {str(e)}")
-            return None
-    
-    def update_hours_status(self, hours_id: str, status: str, verified_by: str, notes: str = None) -> bool:
-        """Update volunteer hours status"""
+            inlined_env.get_template(name)
+            text_env.get_template(name)
+        except TemplateSyntaxError:
+            continue
+
+def render_in_worker(template_name: str, context: Dict[str, Any]) -> Tuple[str, str]:
+    with app.app_context():
+        return render_parts_in_process(template_name, context)
+
+class ProcessRenderPool:
+    """Ships render jobs to a warm process pool, rendering in-process if the pool is unavailable"""
+
+    def __init__(self, processes: int = EMAIL_RENDER_PROCESSES, start_method: str = EMAIL_RENDER_START_METHOD,
+                 timeout: float = EMAIL_RENDER_TIMEOUT):
+        self.processes = processes
+        self.start_method = start_method
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()  # guards the executor and the counters
+        self.counters = {'pooled': 0, 'fallback': 0, 'restarts': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=warm_render_worker
+                )
+            return self._executor
+
+    def _failed(self, error: Exception):
+        logger.warning(f"Render pool unavailable, rendering in-process: {str(error)}")
+        with self._lock:
+            self.counters['fallback'] += 1
+            if isinstance(error, BrokenProcessPool):
+                self._executor = None
+                self.counters['restarts'] += 1
+
+    def start(self):
+        """Spin the workers up ahead of the first render"""
+        pool = self._pool()
+        for future in [pool.submit(warm_render_worker) for _ in range(self.processes)]:
+            future.result(timeout=60)
+
+    def render(self, template_name: str, context: Dict[str, Any]) -> Tuple[str, str]:
+        timeout = stage_timeout('render', self.timeout)
         try:
-            update_data = {
-                'status': status,
-                'verified_by': verified_by,
-                'verification_date': datetime.utcnow().isoformat(),
-                'verification_notes': notes,
-                'updated_at': datetime.utcnow().isoformat()
-            }
-            
-            response = requests.patch(
-                f"{self.url}/rest/v1/volunteer_hours?id=eq.{hours_id}",
-                headers=self.headers,
-                json=update_data
-            )
-            response.raise_for_status()
-            
-            logger.info(f"Hours {hours_id} status updated to {status}")
-            return True
-            
+            parts = self._pool().submit(render_in_worker, template_name, context).result(timeout=timeout)
+            with self._lock:
+                self.counters['pooled'] += 1
+            return parts
         except Exception as e:
-            logger.error(f"Failed to update hours status: {str(e)}")
-            return False
-    
-    def get_student_profile(self, student_id: str) -> Optional[Dict[str, Any]]:
-        """Get student profile by ID"""
+            self._failed(e)
+            return render_parts_in_process(template_name, context)
+
+    def render_many(self, template_name: str, contexts: Iterable[Dict[str, Any]]) -> Iterator[Tuple[str, str]]:
+        contexts = list(contexts)
+        done = 0
+        timeout = stage_timeout('render', self.timeout)
         try:
-            response = requests.get(
-                f"{self.url}/rest/v1/profiles?id=eq.{student_id}",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data[0] if data else None
+            chunksize = max(1, len(contexts) // (self.processes * 4))
+            for parts in self._pool().map(render_in_worker, repeat(template_name), contexts,
+                                          timeout=timeout, chunksize=chunksize):
+                yield parts
+                done += 1
+                with self._lock:
+                    self.counters['pooled'] += 1
         except Exception as e:
-            logger.error(f"Failed to get student profile: {str(e)}")
-            return None
-    
-    def log_email_sent(self, recipient: str, template: str, subject: str, data: Dict[str, Any]) -> bool:
-        """Log email sent to database"""
+            self._failed(e)
+            yield from render_many_in_process(template_name, contexts[done:])
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'processes': self.processes, 'running': self._executor is not None, **self.counters}
+
+render_pool = ProcessRenderPool()
+
+rendered_cache = RenderedEmailCache()
+
+def render_email_cached(template_name: str, volatile: Iterable[str] = (), **context) -> Tuple[str, str]:
+    """render_email_parts through the rendered-body cache"""
+    return rendered_cache.render(template_name, context, lambda: render_email_parts(template_name, **context), volatile)
+
+class MailBatch:
+    """Collects messages and delivers them over a single SMTP session"""
+
+    def __init__(self):
+        self.messages: List[Message] = []
+
+    def add(self, msg: Message) -> int:
+        """Queue a message and return its index in the batch results"""
+        self.messages.append(msg)
+        return len(self.messages) - 1
+
+    def __len__(self):
+        return len(self.messages)
+
+    def send(self) -> List[Dict[str, Any]]:
+        """Send all queued messages, returning one result per message"""
+        messages, self.messages = self.messages, []
+        return send_batch(messages)
+
+def _batch_result(msg: Message, error: Optional[Exception] = None) -> Dict[str, Any]:
+    return {
+        'recipients': list(msg.recipients or msg.bcc or []),
+        'subject': msg.subject,
+        'success': error is None,
+        'error': str(error) if error is not None else None,
+        'transient': error is not None and is_transient_smtp_error(error),
+        'retry_after': error.retry_after if isinstance(error, RateLimitExceeded) else None,
+        'expired': isinstance(error, DeadlineExceeded)
+    }
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"SMTP send budget exhausted, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+send_limiter = SendRateLimiter()
+smtp_breaker = CircuitBreaker('smtp')
+
+def open_mail_connection():
+    """Flask-Mail connection whose SMTP session is opened lazily by send_with_retry"""
+    conn = mail.connect()
+    conn.host = None
+    conn.num_emails = 0
+    return conn
+
+def open_smtp_host(state, timeout: float) -> smtplib.SMTP:
+    """Flask-Mail's Connection.configure_host, with a socket timeout"""
+    if state.use_ssl:
+        host = smtplib.SMTP_SSL(state.server, state.port, timeout=timeout)
+    else:
+        host = smtplib.SMTP(state.server, state.port, timeout=timeout)
+    host.set_debuglevel(int(state.debug))
+    if state.use_tls:
+        host.starttls()
+    if state.username and state.password:
+        host.login(state.username, state.password)
+    return host
+
+def close_mail_connection(conn):
+    if conn.host:
         try:
-            log_data = {
-                'recipient': recipient,
-                'template': template,
-                'subject': subject,
-                'data': json.dumps(data),
-                'status': 'sent',
-                'sent_at': datetime.utcnow().isoformat()
-            }
-            
-            response = requests.post(
-                f"{self.url}/rest/v1/email_logs",
-                headers=self.headers,
-                json=log_data
-            )
-            response.raise_for_status()
-            return True
-            
+            conn.host.quit()
+        except Exception:
+            try:
+                conn.host.close()
+            except Exception:
+                pass
+    conn.host = None
+
+def send_with_retry(conn, msg: Message, attempts: int = SMTP_RETRY_ATTEMPTS) -> None:
+    """Send on a Flask-Mail connection, retrying transient failures with jittered backoff.
+
+    The session is reopened after connection-level errors. A stale session
+    is retried immediately; other transient errors wait before the next attempt.
+    Every attempt is bounded by SMTP_TIMEOUT and the request's send budget, and
+    goes through the SMTP circuit breaker.
+    Every recipient on the envelope is charged against the send budget.
+    Raises RateLimitExceeded when the send budget does not free up in time.
+    """
+    retry_after = send_limiter.acquire(tokens=len(msg.send_to))
+    if retry_after:
+        raise RateLimitExceeded(retry_after)
+    attempt = 0
+    while True:
+        try:
+            timeout = stage_timeout('send', SMTP_TIMEOUT)
+            with smtp_breaker.call(is_transient_smtp_error):
+                if conn.host is None and not mail.suppress:
+                    conn.host = open_smtp_host(conn.mail, timeout)
+                elif conn.host is not None and conn.host.sock is not None:
+                    conn.host.sock.settimeout(timeout)
+                conn.send(msg)
+            return
         except Exception as e:
-            logger.error(f"Failed to log email: {str(e)}")
-            return False
+            attempt += 1
+            if attempt >= attempts or not is_transient_smtp_error(e):
+                raise
+            if not isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                close_mail_connection(conn)
+            if not (attempt == 1 and isinstance(e, smtplib.SMTPServerDisconnected)):
+                delay = retry_delay(attempt)
+                logger.warning(f"Transient SMTP error ({str(e)}), retrying in {delay:.2f}s")
+                time.sleep(stage_timeout('send', delay))
+
+def send_batch(messages: List[Message]) -> List[Dict[str, Any]]:
+    """Send messages over one Flask-Mail connection.
+
+    A rejected recipient only fails its own message; transient failures are
+    retried on the same (reopened if necessary) session.
+    """
+    if not messages:
+        return []
+
+    results = []
+    conn = open_mail_connection()
+    try:
+        for msg in messages:
+            try:
+                send_with_retry(conn, msg)
+                results.append(_batch_result(msg))
+            except RateLimitExceeded as e:
+                results.append(_batch_result(msg, e))
+            except Exception as e:
+                logger.error(f"Failed to send email to {msg.recipients}: {str(e)}")
+                results.append(_batch_result(msg, e))
+    finally:
+        close_mail_connection(conn)
+
+    logger.info(f"Batch sent: {sum(r['success'] for r in results)}/{len(results)} delivered")
+    return results
+
+# Parallel dispatch - bounded so we stay within the provider's connection limit
+MAIL_DISPATCH_WORKERS = int(os.getenv('MAIL_DISPATCH_WORKERS', '4'))
+
+class ParallelMailDispatcher:
+    """Sends messages across a thread pool; every worker thread keeps its own SMTP session"""
+
+    def __init__(self, workers: int = MAIL_DISPATCH_WORKERS):
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='mail-dispatch')
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = open_mail_connection()
+            self._local.conn = conn
+        return conn
+
+    def _send_one(self, msg: Message) -> Dict[str, Any]:
+        with app.app_context():
+            try:
+                send_with_retry(self._connection(), msg)
+                return _batch_result(msg)
+            except RateLimitExceeded as e:
+                return _batch_result(msg, e)
+            except Exception as e:
+                logger.error(f"Failed to send email to {msg.recipients}: {str(e)}")
+                return _batch_result(msg, e)
+
+    def send(self, messages: List[Message]) -> List[Dict[str, Any]]:
+        """Send messages in parallel, returning results in submission order"""
+        deadline = current_deadline.get()
+        return list(self._executor.map(lambda msg: run_with_deadline(deadline, self._send_one, msg), messages))
+
+mail_dispatcher = ParallelMailDispatcher()
+
+# Identical bodies go out as one DATA payload to many RCPTs (Gmail allows 100 per message)
+MAIL_MAX_RECIPIENTS_PER_MESSAGE = int(os.getenv('MAIL_MAX_RECIPIENTS_PER_MESSAGE', '50'))
+UNDISCLOSED_RECIPIENTS = 'undisclosed-recipients:;'
+
+class BccMessage(Message):
+    """A message whose envelope is only its BCC list; the To header names no one"""
+
+    def _message(self):
+        msg = super()._message()
+        msg.replace_header('To', UNDISCLOSED_RECIPIENTS)
+        return msg
+
+def coalesce_identical(messages: List[Message], max_recipients: int = MAIL_MAX_RECIPIENTS_PER_MESSAGE):
+    """Merge messages whose rendered content is identical into BCC-batched envelopes.
+
+    Returns (message, original_indexes) pairs. Merged messages are BccMessages:
+    the envelope carries only the real recipients and the To header is
+    "undisclosed-recipients:;", so recipients never see each other. Messages that already use cc/bcc or attachments are left alone.
+    """
+    groups: Dict[tuple, List[int]] = {}
+    coalesced = []
+    for index, msg in enumerate(messages):
+        if msg.cc or msg.bcc or msg.attachments or msg.extra_headers:
+            coalesced.append((msg, [index]))
+            continue
+        key = (msg.subject, str(msg.sender), msg.html, msg.body, msg.reply_to)
+        groups.setdefault(key, []).append(index)
+
+    for indexes in groups.values():
+        if len(indexes) == 1:
+            coalesced.append((messages[indexes[0]], indexes))
+            continue
+        for start in range(0, len(indexes), max_recipients):
+            chunk = indexes[start:start + max_recipients]
+            first = messages[chunk[0]]
+            merged = BccMessage(
+                first.subject,
+                sender=first.sender,
+                bcc=[recipient for i in chunk for recipient in messages[i].recipients],
+                reply_to=first.reply_to
+            )
+            merged.html = first.html
+            merged.body = first.body
+            coalesced.append((merged, chunk))
+
+    coalesced.sort(key=lambda pair: pair[1][0])
+    return coalesced
+
+def send_coalesced(messages: List[Message], send=send_batch) -> List[Dict[str, Any]]:
+    """Send messages with identical bodies as multi-recipient envelopes.
+
+    `send` is the transport (send_batch or mail_dispatcher.send). Results are
+    expanded back to one per original message, in submission order.
+    """
+    coalesced = coalesce_identical(messages)
+    if len(coalesced) < len(messages):
+        logger.info(f"Coalesced {len(messages)} messages into {len(coalesced)} envelopes")
+    envelope_results = send([msg for msg, _ in coalesced])
+    results: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+    for (_, indexes), envelope_result in zip(coalesced, envelope_results):
+        for index in indexes:
+            results[index] = {**envelope_result, 'recipients': list(messages[index].recipients)}
+    return results
+
+def send_message(msg: Message) -> Dict[str, Any]:
+    """Send a single message, raising if it was neither delivered nor rate limited"""
+    result = send_batch([msg])[0]
+    if not result['success'] and not result['retry_after']:
+        raise RuntimeError(result['error'])
+    return result
+
+# Field specs for this service's own queries (see select_fields)
+OPPORTUNITY_REGISTRANTS_FIELDS = ('id', 'title', 'location', 'date', 'start_time', 'end_time',
+                                  ('opportunity_registrations', ('id', 'status', ('profiles', ('full_name', 'email')))))
+
+class AsyncSupabaseService(AsyncSupabaseClient):
+    def __init__(self):
+        super().__init__(SUPABASE_URL, SUPABASE_SERVICE_KEY)
     
-    def get_admin_profile(self, admin_id: str) -> Optional[Dict[str, Any]]:
-        """Get admin profile by ID"""
+    async def get_opportunity_with_registrants(self, opportunity_id: str) -> Optional[Dict[str, Any]]:
+        """Get an opportunity with its registrations and their student profiles in one request"""
         try:
-            response = requests.get(
-                f"{self.url}/rest/v1/profiles?id=eq.{admin_id}",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data[0] if data else None
+            return await self.get_one('volunteer_opportunities', opportunity_id, OPPORTUNITY_REGISTRANTS_FIELDS)
         except Exception as e:
-            logger.error(f"Failed to get admin profile: {str(e)}")
+            logger.error(f"Failed to get opportunity registrants: {str(e)}")
             return None
+
+class SupabaseService(SupabaseClient):
+    def __init__(self):
+        super().__init__(AsyncSupabaseService())
     
-    def log_admin_activity(self, admin_id: str, action: str, details: Dict[str, Any]) -> bool:
-        """Log admin activity"""
-        try:
-            log_data = {
-                'admin_id': admin_id,
-                'action': action,
-                'details': json.dumps(details),
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            
-            response = requests.post(
-                f"{self.url}/rest/v1/admin_activity_logs",
-                headers=self.headers,
-                json=log_data
-            )
-            response.raise_for_status()
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to log admin activity: {str(e)}")
-            return False
+    def get_opportunity_with_registrants(self, opportunity_id: str) -> Optional[Dict[str, Any]]:
+        return self.io.run(self.aio.get_opportunity_with_registrants(opportunity_id))
 
 # Initialize services
 supabase_service = SupabaseService()
+atexit.register(supabase_service.log_buffer.close)
+
+# Outbox configuration - queue rendered emails and deliver them in the background
+EMAIL_OUTBOX_ENABLED = os.getenv('EMAIL_OUTBOX_ENABLED', 'false').lower() == 'true'
+EMAIL_OUTBOX_URL = os.getenv('EMAIL_OUTBOX_URL', 'sqlite:////tmp/email_outbox.db')
+EMAIL_OUTBOX_WORKERS = int(os.getenv('EMAIL_OUTBOX_WORKERS', '2'))
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', '20'))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', '5'))
+EMAIL_OUTBOX_RETRY_BASE = float(os.getenv('EMAIL_OUTBOX_RETRY_BASE', '30'))
+EMAIL_OUTBOX_LEASE = float(os.getenv('EMAIL_OUTBOX_LEASE', '120'))
+EMAIL_OUTBOX_POLL_INTERVAL = float(os.getenv('EMAIL_OUTBOX_POLL_INTERVAL', '5'))
+
+def message_to_payload(msg: Message, template: Optional[str] = None, log_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Serialize a rendered message (and what to log once it is delivered)"""
+    return {
+        'subject': msg.subject,
+        'sender': msg.sender,
+        'recipients': list(msg.recipients),
+        'bcc': list(msg.bcc or []),
+        'html': msg.html,
+        'body': msg.body,
+        'template': template,
+        'log_data': log_data
+    }
+
+def payload_to_message(payload: Dict[str, Any]) -> Message:
+    sender = payload.get('sender')
+    message_class = Message if payload['recipients'] else BccMessage
+    msg = message_class(
+        payload['subject'],
+        sender=tuple(sender) if isinstance(sender, list) else sender,
+        recipients=payload['recipients'],
+        bcc=payload.get('bcc') or None
+    )
+    msg.html = payload.get('html')
+    msg.body = payload.get('body')
+    return msg
+
+class OutboxWorker:
+    """Background threads that drain the outbox with exponential backoff retries"""
+
+    def __init__(self, store: OutboxStore, workers: int = EMAIL_OUTBOX_WORKERS,
+                 batch_size: int = EMAIL_OUTBOX_BATCH_SIZE, max_attempts: int = EMAIL_OUTBOX_MAX_ATTEMPTS,
+                 retry_base: float = EMAIL_OUTBOX_RETRY_BASE, lease: float = EMAIL_OUTBOX_LEASE,
+                 poll_interval: float = EMAIL_OUTBOX_POLL_INTERVAL):
+        self.store = store
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'email-outbox-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                processed = self.drain_once()
+            except Exception as e:
+                logger.error(f"Outbox worker error: {str(e)}")
+                processed = 0
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def drain_once(self) -> int:
+        """Deliver one batch of due messages over a single SMTP session"""
+        claimed = self.store.claim(self.batch_size, self.lease)
+        if not claimed:
+            return 0
+
+        with app.app_context():
+            results = send_batch([payload_to_message(item['payload']) for item in claimed])
+
+        for item, result in zip(claimed, results):
+            payload = item['payload']
+            if result['success']:
+                self.store.mark_sent(item['id'])
+                if payload.get('template'):
+                    supabase_service.log_email_sent(
+                        recipient=', '.join(payload.get('bcc') or payload['recipients']),
+                        template=payload['template'],
+                        subject=payload['subject'],
+                        data=payload.get('log_data') or {}
+                    )
+            elif result['retry_after']:
+                self.store.release(item['id'], time.time() + result['retry_after'])
+            elif item['attempts'] >= self.max_attempts or not result['transient']:
+                logger.error(f"Outbox message {item['id']} failed permanently: {result['error']}")
+                self.store.mark_failed(item['id'], result['error'], None)
+                dead_letter_payload(payload, result['error'])
+            else:
+                delay = self.retry_base * (2 ** (item['attempts'] - 1))
+                self.store.mark_failed(item['id'], result['error'], time.time() + delay)
+        return len(claimed)
+
+_outbox_worker: Optional[OutboxWorker] = None
+_outbox_lock = threading.Lock()
+
+def get_outbox() -> OutboxWorker:
+    """Create the outbox store and start its workers on first use"""
+    global _outbox_worker
+    with _outbox_lock:
+        if _outbox_worker is None:
+            _outbox_worker = OutboxWorker(create_outbox_store(EMAIL_OUTBOX_URL))
+            _outbox_worker.start()
+        return _outbox_worker
+
+def defer_rate_limited(messages: List[Message], results: List[Dict[str, Any]],
+                       template: Optional[str] = None, log_data: Optional[Dict[str, Any]] = None) -> int:
+    """Queue rate-limited messages in the outbox for when the send budget frees up.
+
+    Their results are updated in place to count as accepted; returns how many were deferred.
+    """
+    deferred = 0
+    for msg, result in zip(messages, results):
+        if result['success'] or not result['retry_after']:
+            continue
+        outbox = get_outbox()
+        result['outbox_id'] = outbox.store.enqueue(message_to_payload(msg, template, log_data), delay=result['retry_after'])
+        result['deferred'] = True
+        result['success'] = True
+        deferred += 1
+    if deferred:
+        logger.warning(f"Send budget exhausted, deferred {deferred} message(s) to the outbox")
+    return deferred
+
+def dead_letter_payload(payload: Dict[str, Any], error: str) -> bool:
+    """Record a permanently failed message in email_logs so it can be replayed later"""
+    return supabase_service.log_email_failed(
+        recipient=', '.join(payload.get('bcc') or payload['recipients']),
+        template=payload.get('template') or 'unknown',
+        subject=payload['subject'],
+        message=payload,
+        error=error
+    )
+
+def dead_letter(msg: Message, error: Any, template: Optional[str] = None, log_data: Optional[Dict[str, Any]] = None) -> bool:
+    return dead_letter_payload(message_to_payload(msg, template, log_data), str(error))
+
+def dispatch_email(msg: Message, template: Optional[str] = None, log_data: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Queue the message in the outbox when enabled, otherwise send it now.
+
+    Returns the outbox message id when queued (including sends deferred by
+    the rate limiter), or None after a synchronous send (which also writes
+    the email log when a template is given).
+    """
+    if EMAIL_OUTBOX_ENABLED:
+        outbox = get_outbox()
+        message_id = outbox.store.enqueue(message_to_payload(msg, template, log_data))
+        outbox.notify()
+        return message_id
+
+    try:
+        result = send_message(msg)
+    except Exception as e:
+        dead_letter(msg, e, template, log_data)
+        raise
+    if result['retry_after']:
+        defer_rate_limited([msg], [result], template, log_data)
+        return result['outbox_id']
+    if template:
+        supabase_service.log_email_sent(
+            recipient=', '.join(msg.bcc or msg.recipients),
+            template=template,
+            subject=msg.subject,
+            data=log_data or {}
+        )
+    return None
+
+def queued_response(message_ids: List[str], **fields):
+    """202 response for messages accepted into the outbox"""
+    return jsonify({
+        'success': True,
+        'queued': True,
+        'message_ids': message_ids,
+        'status_urls': [f"/api/email/outbox/{message_id}" for message_id in message_ids],
+        **fields
+    }), 202
 
 def generate_verification_token(hours_id: str, action: str, verifier_email: str) -> str:
     """Generate HMAC verification token"""
@@ -293,6 +888,79 @@ HOURS_VERIFICATION_TEMPLATE = """
 </body>
 </html>
 """
+HOURS_VERIFICATION_TEMPLATE_NAME = register_template('hours_verification.html', HOURS_VERIFICATION_TEMPLATE)
+
+PROFILE_SHARE_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Volunteer Profile Shared</title>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }
+        .content { background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }
+        .profile-card { background: white; padding: 20px; border-radius: 8px; margin: 20px 0; border-left: 4px solid #667eea; }
+        .button { display: inline-block; padding: 12px 24px; background: #667eea; color: white; text-decoration: none; border-radius: 6px; margin: 10px 5px; }
+        .footer { text-align: center; margin-top: 30px; color: #666; font-size: 14px; }
+        .student-info { background: #e3f2fd; padding: 15px; border-radius: 6px; margin: 15px 0; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>Volunteer Profile Shared</h1>
+            <p>Volunteer Central</p>
+        </div>
+
+        <div class="content">
+            <h2>Hello!</h2>
+            <p>{{ student_name }} has shared their volunteer profile with you. Check out their community service contributions and achievements!</p>
+
+            <div class="student-info">
+                <h3>Student Information</h3>
+                <p><strong>Name:</strong> {{ student_name }}</p>
+                <p><strong>Email:</strong> {{ student_email }}</p>
+            </div>
+
+            {% if custom_message %}
+            <div class="profile-card">
+                <h3>Personal Message</h3>
+                <p><em>"{{ custom_message }}"</em></p>
+            </div>
+            {% endif %}
+
+            <div class="profile-card">
+                <h3>View Profile</h3>
+                <p>Click the button below to view {{ student_name }}'s complete volunteer profile, including:</p>
+                <ul>
+                    <li>Total volunteer hours</li>
+                    <li>Recent activities and achievements</li>
+                    <li>Club memberships</li>
+                    <li>Community impact</li>
+                </ul>
+
+                <div style="text-align: center; margin-top: 20px;">
+                    <a href="{{ share_url }}" class="button">View Volunteer Profile</a>
+                </div>
+            </div>
+
+            <p style="margin-top: 30px; font-size: 14px; color: #666;">
+                <strong>Note:</strong> This profile link is shared by {{ student_name }}. If you have any questions, please contact them directly.
+            </p>
+        </div>
+
+        <div class="footer">
+            <p>Volunteer Central - Building Community Through Service</p>
+            <p>This is an automated message. Please do not reply to this email.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+PROFILE_SHARE_TEMPLATE_NAME = register_template('profile_share.html', PROFILE_SHARE_TEMPLATE)
 
 @app.route('/api/email/send-verification-email', methods=['POST'])
 def send_verification_email():
@@ -315,13 +983,14 @@ def send_verification_email():
         
         logger.info(f"Processing verification email for hours_id: {hours_id}, verifier: {verifier_email}, student: {student_id}")
         
-        # Get hours details from database
-        hours_data = supabase_service.get_hours_by_id(hours_id)
+        # Get hours details and the student's profile in one request
+        hours_data, student_profile = supabase_service.get_hours_with_student(hours_id)
         if not hours_data:
             return jsonify({'error': 'Hours record not found'}), 404
         
-        # Get student profile
-        student_profile = supabase_service.get_student_profile(student_id)
+        # The caller names the student; only look them up separately if it isn't the hours owner
+        if str(hours_data.get('student_id')) != str(student_id):
+            student_profile = supabase_service.get_student_profile(student_id)
         if not student_profile:
             return jsonify({'error': 'Student profile not found'}), 404
         
@@ -347,8 +1016,12 @@ def send_verification_email():
         }
         
         # Render email template via Jinja file and inline CSS
-        html_content = render_email(
+        html_content, text_content = render_email_cached(
             'verification_request.html',
+            # The signed links are regenerated per request; key on what they point at instead
+            volatile=('approve_url', 'deny_url'),
+            hours_id=hours_id,
+            verifier_email=verifier_email,
             subject='Action Needed: Verify Student Volunteer Hours',
             preheader=f"Review and approve/deny the hours for {template_data['student_name']}",
             **template_data
@@ -364,19 +1037,14 @@ def send_verification_email():
             recipients=[verifier_email]
         )
         msg.html = html_content
+        msg.body = text_content
         
         logger.info("Sending email...")
-        mail.send(msg)
+        message_id = dispatch_email(msg, template='verification_request', log_data=template_data)
+        if message_id:
+            return queued_response([message_id], hours_id=hours_id, verifier_email=verifier_email)
         logger.info("Email sent successfully!")
         
-        # Log email sent
-        supabase_service.log_email_sent(
-            recipient=verifier_email,
-            template='verification_request',
-            subject=msg.subject,
-            data=template_data
-        )
-        
         return jsonify({
             'success': True,
             'message': 'Verification email sent successfully',
@@ -403,13 +1071,10 @@ def verify_hours():
         if not verify_token(token, hours_id, action, verifier_email):
             return jsonify({'error': 'Invalid or expired verification token'}), 400
 
-        # Get hours data
-        hours_data = supabase_service.get_hours_by_id(hours_id)
+        # Get hours and the student's profile in one request
+        hours_data, student_profile = supabase_service.get_hours_with_student(hours_id)
         if not hours_data:
             return jsonify({'error': 'Hours record not found'}), 404
-
-        # Get student profile
-        student_profile = supabase_service.get_student_profile(hours_data['student_id'])
         if not student_profile:
             return jsonify({'error': 'Student profile not found'}), 404
 
@@ -546,9 +1211,10 @@ def test_send_email():
             </div>
         </div>
         """
+        msg.body = html_to_text(msg.html)
         
         # Send the email
-        mail.send(msg)
+        send_message(msg)
         
         logger.info(f"Test email sent successfully to {test_email}")
         
@@ -582,7 +1248,7 @@ def opportunity_confirmation():
         if not (student_email and title):
             return jsonify({'error': 'Missing required fields'}), 400
 
-        html = render_email('opportunity_confirmation.html',
+        html, text = render_email_parts('opportunity_confirmation.html',
             subject=f'You are registered: {title}',
             preheader=f'Registration confirmed for {title}',
             student_name=student_name,
@@ -595,7 +1261,10 @@ def opportunity_confirmation():
         )
         msg = Message(f'You are registered: {title}', sender=app.config['MAIL_USERNAME'], recipients=[student_email])
         msg.html = html
-        mail.send(msg)
+        msg.body = text
+        message_id = dispatch_email(msg)
+        if message_id:
+            return queued_response([message_id])
         return jsonify({'success': True})
     except Exception as e:
         logger.error(f"Opportunity confirmation error: {str(e)}")
@@ -617,7 +1286,7 @@ def opportunity_reminder():
         if not (student_email and title):
             return jsonify({'error': 'Missing required fields'}), 400
 
-        html = render_email('opportunity_reminder.html',
+        html, text = render_email_parts('opportunity_reminder.html',
             subject=f'Reminder: {title} is coming up',
             preheader='Your volunteer opportunity starts soon',
             student_name=student_name,
@@ -630,7 +1299,10 @@ def opportunity_reminder():
         )
         msg = Message(f'Reminder: {title} is coming up', sender=app.config['MAIL_USERNAME'], recipients=[student_email])
         msg.html = html
-        mail.send(msg)
+        msg.body = text
+        message_id = dispatch_email(msg)
+        if message_id:
+            return queued_response([message_id])
         return jsonify({'success': True})
     except Exception as e:
         logger.error(f"Opportunity reminder error: {str(e)}")
@@ -652,7 +1324,7 @@ def opportunity_cancellation():
         if not (student_email and title):
             return jsonify({'error': 'Missing required fields'}), 400
 
-        html = render_email('opportunity_cancellation.html',
+        html, text = render_email_parts('opportunity_cancellation.html',
             subject=f'Registration cancelled: {title}',
             preheader=f'You have left {title}',
             student_name=student_name,
@@ -665,12 +1337,144 @@ def opportunity_cancellation():
         )
         msg = Message(f'Registration cancelled: {title}', sender=app.config['MAIL_USERNAME'], recipients=[student_email])
         msg.html = html
-        mail.send(msg)
+        msg.body = text
+        message_id = dispatch_email(msg)
+        if message_id:
+            return queued_response([message_id])
         return jsonify({'success': True})
     except Exception as e:
         logger.error(f"Opportunity cancellation error: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+# Opportunity-wide notifications: template, subject and preheader per kind
+OPPORTUNITY_FANOUT_KINDS = {
+    'reminder': ('opportunity_reminder.html', 'Reminder: {title} is coming up', 'Your volunteer opportunity starts soon'),
+    'cancellation': ('opportunity_cancellation.html', 'Registration cancelled: {title}', 'You have left {title}')
+}
+OPPORTUNITY_FANOUT_CHUNK_SIZE = int(os.getenv('OPPORTUNITY_FANOUT_CHUNK_SIZE', '50'))
+
+@app.route('/api/email/opportunity-fanout', methods=['POST'])
+def opportunity_fanout():
+    """Send a reminder or cancellation to every registrant of an opportunity.
+
+    Registrants are resolved in one PostgREST request. Each distinct context
+    is rendered once, and recipients sharing a rendered body are sent one
+    BCC-batched envelope, in chunks through the parallel dispatcher.
+    Progress is streamed back as newline-delimited JSON, or, when the outbox
+    is enabled, the messages are queued and their ids returned.
+    The whole stream shares the request's deadline: once it has no time left
+    for another chunk, the remaining recipients are handed to the outbox and
+    counted as deferred.
+    """
+    try:
+        data = request.get_json()
+        opportunity_id = data.get('opportunity_id')
+        kind = data.get('kind', 'reminder')
+
+        if not opportunity_id or kind not in OPPORTUNITY_FANOUT_KINDS:
+            return jsonify({'error': 'opportunity_id and a valid kind (reminder, cancellation) are required'}), 400
+
+        opportunity = supabase_service.get_opportunity_with_registrants(opportunity_id)
+        if not opportunity:
+            return jsonify({'error': 'Opportunity not found'}), 404
+
+        statuses = data.get('statuses')
+        recipients = {}
+        for registration in opportunity.get('opportunity_registrations') or []:
+            profile = registration.get('profiles') or {}
+            if not profile.get('email'):
+                continue
+            if statuses and registration.get('status') not in statuses:
+                continue
+            recipients[profile['email']] = profile.get('full_name') or 'Student'
+
+        title = data.get('title') or opportunity.get('title') or 'Volunteer Opportunity'
+        start_time, end_time = opportunity.get('start_time'), opportunity.get('end_time')
+        shared_context = {
+            'title': title,
+            'organization': data.get('organization', 'Community Organization'),
+            'location': opportunity.get('location') or 'TBD',
+            'date': opportunity.get('date') or '',
+            'time': f"{start_time} - {end_time}" if start_time and end_time else (start_time or ''),
+            'duration': data.get('duration', '')
+        }
+        template_name, subject_format, preheader_format = OPPORTUNITY_FANOUT_KINDS[kind]
+        subject = subject_format.format(title=title)
+        preheader = preheader_format.format(title=title)
+
+        # Render once per distinct context; only the student name varies
+        student_names = list(dict.fromkeys(recipients.values()))
+        contexts = (
+            {'subject': subject, 'preheader': preheader, 'student_name': student_name, **shared_context}
+            for student_name in student_names
+        )
+        rendered = dict(zip(student_names, render_many(template_name, contexts)))
+        messages = []
+        for student_email, student_name in recipients.items():
+            msg = Message(subject, sender=app.config['MAIL_USERNAME'], recipients=[student_email])
+            msg.html, msg.body = rendered[student_name]
+            messages.append(msg)
+
+        logger.info(f"Opportunity {kind} fan-out for {opportunity_id}: {len(messages)} recipients, {len(rendered)} renders")
+
+        if EMAIL_OUTBOX_ENABLED:
+            message_ids = [dispatch_email(envelope) for envelope, _ in coalesce_identical(messages)]
+            return queued_response(message_ids, opportunity_id=opportunity_id, kind=kind, total=len(messages))
+
+        deadline = current_deadline.get() or Deadline()
+
+        def queue_in_outbox(pending):
+            """Hand messages the request has no time left for to the outbox"""
+            outbox = get_outbox()
+            for envelope, _ in coalesce_identical(pending):
+                outbox.store.enqueue(message_to_payload(envelope))
+            outbox.notify()
+            logger.warning(f"Fan-out deadline reached, queued {len(pending)} message(s) in the outbox")
+
+        def send_chunk(chunk):
+            results = send_coalesced(chunk, send=mail_dispatcher.send)
+            deferred = defer_rate_limited(chunk, results)
+            expired = [(msg, result) for msg, result in zip(chunk, results) if result['expired']]
+            if expired:
+                queue_in_outbox([msg for msg, _ in expired])
+                for _, result in expired:
+                    result['deferred'] = True
+                    result['success'] = True
+            for msg, result in zip(chunk, results):
+                if not result['success']:
+                    dead_letter(msg, result['error'], template_name)
+            return results, deferred + len(expired)
+
+        def generate():
+            sent = failed = deferred = 0
+            slowest_chunk = 0.0
+            for start in range(0, len(messages), OPPORTUNITY_FANOUT_CHUNK_SIZE):
+                if start and deadline.remaining() - STAGE_RESERVES.get('send', 0.0) < slowest_chunk:
+                    queue_in_outbox(messages[start:])
+                    deferred += len(messages) - start
+                    break
+                chunk = messages[start:start + OPPORTUNITY_FANOUT_CHUNK_SIZE]
+                started = time.monotonic()
+                results, chunk_deferred = run_with_deadline(deadline, send_chunk, chunk)
+                slowest_chunk = max(slowest_chunk, time.monotonic() - started)
+                deferred += chunk_deferred
+                sent += sum(1 for result in results if result['success'] and not result.get('deferred'))
+                failed += sum(1 for result in results if not result['success'])
+                yield json.dumps({
+                    'sent': sent,
+                    'failed': failed,
+                    'deferred': deferred,
+                    'total': len(messages),
+                    'failures': [result for result in results if not result['success']]
+                }) + '\n'
+            yield json.dumps({'done': True, 'sent': sent, 'failed': failed, 'deferred': deferred, 'total': len(messages)}) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    except Exception as e:
+        logger.error(f"Opportunity fan-out error: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @app.route('/api/email/hours-update-notification', methods=['POST'])
 def hours_update_notification():
     """Send notification email when hours are updated by admin"""
@@ -700,9 +1504,7 @@ def hours_update_notification():
         
         if SUPABASE_URL and SUPABASE_SERVICE_KEY:
             # Supabase is configured, try to fetch data
-            hours_data = supabase_service.get_hours_by_id(hours_id)
-            if hours_data:
-                student_profile = supabase_service.get_student_profile(hours_data['student_id'])
+            hours_data, student_profile = supabase_service.get_hours_with_student(hours_id)
         
         # Use fallback data if Supabase data is not available
         if not hours_data:
@@ -746,33 +1548,34 @@ def hours_update_notification():
         }
         
         # Render email template
-        html_content = render_email(
+        html_content, text_content = render_email_cached(
             template_name,
+            volatile=('approval_date', 'denial_date'),
             subject=subject,
             preheader=preheader,
             **template_data
         )
         
-        # Send email to verifier
+        # Queue email to verifier; both notifications go out over one SMTP session
         logger.info(f"Preparing to send notification email to: {verifier_email}")
         
+        batch = MailBatch()
         msg = Message(
             subject,
             sender=app.config['MAIL_USERNAME'],
             recipients=[verifier_email]
         )
         msg.html = html_content
-        
-        logger.info("Sending notification email...")
-        mail.send(msg)
-        logger.info("Notification email sent successfully!")
+        msg.body = text_content
+        verifier_index = batch.add(msg)
         
         # Also notify the student about the update
+        student_index = None
+        student_email = student_profile.get('email')
         try:
-            student_email = student_profile.get('email')
             if student_email:
                 student_subject = f"Your Volunteer Hours Were {status.title()}"
-                student_html = render_email(
+                student_html, student_text = render_email_cached(
                     'student_notification.html',
                     subject=student_subject,
                     preheader=f"Your volunteer hours have been {status}",
@@ -786,25 +1589,56 @@ def hours_update_notification():
                 )
                 student_msg = Message(student_subject, sender=app.config['MAIL_USERNAME'], recipients=[student_email])
                 student_msg.html = student_html
-                mail.send(student_msg)
-                logger.info(f"Student notification sent to: {student_email}")
+                student_msg.body = student_text
+                student_index = batch.add(student_msg)
         except Exception as e:
-            logger.warning(f"Failed to notify student: {str(e)}")
+            logger.warning(f"Failed to prepare student notification: {str(e)}")
+        
+        if EMAIL_OUTBOX_ENABLED:
+            message_ids = [dispatch_email(batch.messages[verifier_index], template=template_name, log_data=template_data)]
+            if student_index is not None:
+                message_ids.append(dispatch_email(batch.messages[student_index]))
+            return queued_response(message_ids, hours_id=hours_id, verifier_email=verifier_email, status=status)
+        
+        logger.info("Sending notification emails...")
+        messages = list(batch.messages)
+        results = batch.send()
+        # Only the verifier email is logged, so only it carries the template for the deferred log row
+        defer_rate_limited([messages[verifier_index]], [results[verifier_index]], template_name, template_data)
+        if student_index is not None:
+            defer_rate_limited([messages[student_index]], [results[student_index]])
+        
+        if not results[verifier_index]['success']:
+            logger.error(f"Failed to send notification email: {results[verifier_index]['error']}")
+            dead_letter(messages[verifier_index], results[verifier_index]['error'], template_name, template_data)
+            return jsonify({'error': 'Failed to send notification email'}), 500
+        verifier_queued = bool(results[verifier_index].get('deferred'))
+        logger.info("Notification email queued for later delivery" if verifier_queued else "Notification email sent successfully!")
+        
+        if student_index is not None:
+            if results[student_index]['success']:
+                logger.info(f"Student notification sent to: {student_email}")
+            else:
+                logger.warning(f"Failed to notify student: {results[student_index]['error']}")
+                dead_letter(messages[student_index], results[student_index]['error'], 'student_notification.html')
         
-        # Log email sent
+        # Log email sent; a deferred email is logged again as sent once the outbox delivers it
         supabase_service.log_email_sent(
             recipient=verifier_email,
             template=template_name,
             subject=subject,
-            data=template_data
+            data=template_data,
+            status='queued' if verifier_queued else 'sent'
         )
         
         return jsonify({
             'success': True,
-            'message': 'Hours update notification sent successfully',
+            'message': 'Hours update notification queued' if verifier_queued else 'Hours update notification sent successfully',
+            'queued': verifier_queued,
             'hours_id': hours_id,
             'verifier_email': verifier_email,
-            'status': status
+            'status': status,
+            'student_notified': student_index is not None and results[student_index]['success']
         })
         
     except Exception as e:
@@ -835,11 +1669,11 @@ def send_hours_notification():
         admin_profile = None
         
         if SUPABASE_URL and SUPABASE_SERVICE_KEY:
-            # Supabase is configured, try to fetch data
-            hours_data = supabase_service.get_hours_by_id(hours_id)
-            if hours_data:
-                student_profile = supabase_service.get_student_profile(hours_data['student_id'])
-                admin_profile = supabase_service.get_admin_profile(admin_id)
+            # Supabase is configured, fetch the hours (with the student) and the admin concurrently
+            (hours_data, student_profile), admin_profile = supabase_service.gather(
+                supabase_service.aio.get_hours_with_student(hours_id),
+                supabase_service.aio.get_admin_profile(admin_id)
+            )
         
         # Use fallback data if Supabase data is not available
         if not hours_data:
@@ -887,7 +1721,7 @@ def send_hours_notification():
             subject = f"Volunteer Hours Update - {template_data['student_name']}"
         
         # Render email template
-        html_content = render_email(template_name, **template_data)
+        html_content, text_content = render_email_cached(template_name, volatile=('verification_date',), **template_data)
         
         # Send email
         msg = Message(
@@ -896,16 +1730,9 @@ def send_hours_notification():
             recipients=[student_email]
         )
         msg.html = html_content
+        msg.body = text_content
         
-        mail.send(msg)
-        
-        # Log email sent
-        supabase_service.log_email_sent(
-            recipient=student_email,
-            template=f'hours_{status}',
-            subject=subject,
-            data=template_data
-        )
+        message_id = dispatch_email(msg, template=f'hours_{status}', log_data=template_data)
         
         # Log admin activity
         supabase_service.log_admin_activity(
@@ -919,6 +1746,9 @@ def send_hours_notification():
             }
         )
         
+        if message_id:
+            return queued_response([message_id], student_email=student_email, status=status)
+        
         return jsonify({
             'success': True,
             'message': f'Hours {status} notification sent',
@@ -939,16 +1769,29 @@ def send_profile_share():
         logger.info(f"Request data: {data}")
         
         # Validate required fields
-        required_fields = ['student_name', 'student_email', 'share_url', 'recipient_email']
+        required_fields = ['student_name', 'student_email', 'share_url']
         for field in required_fields:
             if field not in data:
                 logger.error(f"Missing required field: {field}")
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
+        # One recipient_email, or a recipient_emails list sharing one identical body
+        if 'recipient_emails' in data:
+            recipient_emails = data['recipient_emails']
+            if not (isinstance(recipient_emails, list) and recipient_emails
+                    and all(isinstance(email, str) and email for email in recipient_emails)):
+                logger.error("Invalid recipient_emails: expected a non-empty list of email addresses")
+                return jsonify({'error': 'recipient_emails must be a non-empty list of email addresses'}), 400
+        else:
+            recipient_emails = [data.get('recipient_email')]
+            if not isinstance(recipient_emails[0], str) or not recipient_emails[0]:
+                logger.error("Missing required field: recipient_email")
+                return jsonify({'error': 'Missing required field: recipient_email'}), 400
+        
         student_name = data['student_name']
         student_email = data['student_email']
         share_url = data['share_url']
-        recipient_email = data['recipient_email']
+        recipient_email = ', '.join(recipient_emails)
         custom_message = data.get('custom_message', '')
         
         logger.info(f"Processing profile share email for student: {student_name} to: {recipient_email}")
@@ -962,81 +1805,9 @@ def send_profile_share():
             'dashboard_url': FRONTEND_URL
         }
         
-        # Create profile sharing email template
-        profile_share_template = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Volunteer Profile Shared</title>
-            <style>
-                body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
-                .container { max-width: 600px; margin: 0 auto; padding: 20px; }
-                .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }
-                .content { background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }
-                .profile-card { background: white; padding: 20px; border-radius: 8px; margin: 20px 0; border-left: 4px solid #667eea; }
-                .button { display: inline-block; padding: 12px 24px; background: #667eea; color: white; text-decoration: none; border-radius: 6px; margin: 10px 5px; }
-                .footer { text-align: center; margin-top: 30px; color: #666; font-size: 14px; }
-                .student-info { background: #e3f2fd; padding: 15px; border-radius: 6px; margin: 15px 0; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Volunteer Profile Shared</h1>
-                    <p>Volunteer Central</p>
-                </div>
-                
-                <div class="content">
-                    <h2>Hello!</h2>
-                    <p>{{ student_name }} has shared their volunteer profile with you. Check out their community service contributions and achievements!</p>
-                    
-                    <div class="student-info">
-                        <h3>Student Information</h3>
-                        <p><strong>Name:</strong> {{ student_name }}</p>
-                        <p><strong>Email:</strong> {{ student_email }}</p>
-                    </div>
-                    
-                    {% if custom_message %}
-                    <div class="profile-card">
-                        <h3>Personal Message</h3>
-                        <p><em>"{{ custom_message }}"</em></p>
-                    </div>
-                    {% endif %}
-                    
-                    <div class="profile-card">
-                        <h3>View Profile</h3>
-                        <p>Click the button below to view {{ student_name }}'s complete volunteer profile, including:</p>
-                        <ul>
-                            <li>Total volunteer hours</li>
-                            <li>Recent activities and achievements</li>
-                            <li>Club memberships</li>
-                            <li>Community impact</li>
-                        </ul>
-                        
-                        <div style="text-align: center; margin-top: 20px;">
-                            <a href="{{ share_url }}" class="button">View Volunteer Profile</a>
-                        </div>
-                    </div>
-                    
-                    <p style="margin-top: 30px; font-size: 14px; color: #666;">
-                        <strong>Note:</strong> This profile link is shared by {{ student_name }}. If you have any questions, please contact them directly.
-                    </p>
-                </div>
-                
-                <div class="footer">
-                    <p>Volunteer Central - Building Community Through Service</p>
-                    <p>This is an automated message. Please do not reply to this email.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
         # Render email template
-        html_content = render_email(
-            profile_share_template,
+        html_content, text_content = render_email_parts(
+            PROFILE_SHARE_TEMPLATE_NAME,
             subject=f'{student_name} shared their volunteer profile with you',
             preheader=f'Check out {student_name}\'s volunteer achievements',
             **template_data
@@ -1045,25 +1816,28 @@ def send_profile_share():
         # Send email using Flask-Mail
         logger.info(f"Preparing to send profile share email to: {recipient_email}")
         
-        msg = Message(
-            f'{student_name} shared their volunteer profile with you',
-            sender=app.config['MAIL_USERNAME'],
-            recipients=[recipient_email]
-        )
-        msg.html = html_content
+        messages = []
+        for email in recipient_emails:
+            msg = Message(
+                f'{student_name} shared their volunteer profile with you',
+                sender=app.config['MAIL_USERNAME'],
+                recipients=[email]
+            )
+            msg.html = html_content
+            msg.body = text_content
+            messages.append(msg)
         
+        # Identical bodies: one DATA payload to many recipients
         logger.info("Sending profile share email...")
-        mail.send(msg)
+        message_ids = [
+            dispatch_email(envelope, template='profile_share', log_data=template_data)
+            for envelope, _ in coalesce_identical(messages)
+        ]
+        queued_ids = [message_id for message_id in message_ids if message_id]
+        if queued_ids:
+            return queued_response(queued_ids, recipient=recipient_email, student_name=student_name)
         logger.info("Profile share email sent successfully!")
         
-        # Log email sent
-        supabase_service.log_email_sent(
-            recipient=recipient_email,
-            template='profile_share',
-            subject=msg.subject,
-            data=template_data
-        )
-        
         return jsonify({
             'success': True,
             'message': 'Profile share email sent successfully',
@@ -1075,10 +1849,92 @@ def send_profile_share():
         logger.error(f"Error sending profile share email: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def dead_letter_message(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Extract the stored rendered message from a dead-letter email_logs row"""
+    data = row.get('data')
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return None
+    if not isinstance(data, dict):
+        return None
+    message = data.get('message')
+    return message if isinstance(message, dict) and message.get('html') else None
+
+@app.cli.command('replay-dead-letters')
+@click.option('--limit', default=100, help='Maximum number of failed emails to replay')
+def replay_dead_letters(limit):
+    """Re-send dead-lettered emails from email_logs without re-rendering them"""
+    rows = supabase_service.get_failed_emails(limit)
+    messages, replayable = [], []
+    for row in rows:
+        message = dead_letter_message(row)
+        if message:
+            payload = {**message, 'sender': message.get('sender') or app.config['MAIL_DEFAULT_SENDER']}
+            messages.append(payload_to_message(payload))
+            replayable.append(row)
+    results = send_batch(messages)
+    replayed = 0
+    for row, result in zip(replayable, results):
+        if result['success']:
+            supabase_service.mark_email_sent(row['id'])
+            replayed += 1
+        else:
+            logger.error(f"Replay of email log {row.get('id')} failed: {result['error']}")
+    click.echo(f"Replayed {replayed}, failed {len(results) - replayed}, skipped {len(rows) - len(results)} of {len(rows)} dead-lettered emails")
+
+@app.cli.command('verify-inlined-templates')
+def verify_inlined_templates():
+    """Diff every pre-inlined template against the per-email premailer output"""
+    mismatched = 0
+    for name in app.jinja_env.loader.list_templates():
+        try:
+            source = app.jinja_env.loader.get_source(app.jinja_env, name)[0]
+            variables = meta.find_undeclared_variables(app.jinja_env.parse(source))
+        except TemplateSyntaxError:
+            continue
+        context = {variable: f'sample-{variable}' for variable in variables}
+        with app.test_request_context():
+            preinlined = inlined_env.get_template(name).render(**context)
+            diff = diff_inlined(name, preinlined, render_transformed(name, **context))
+        if diff:
+            mismatched += 1
+            click.echo('\n'.join(diff))
+        click.echo(f"{'differs' if diff else 'ok':8} {name}")
+    if mismatched:
+        raise click.ClickException(f"{mismatched} template(s) differ from the premailer output")
+
+@app.route('/api/email/outbox/<message_id>', methods=['GET'])
+def outbox_status(message_id):
+    """Report delivery state of a queued email.
+
+    Rate-limited sends are deferred to the outbox store even when
+    EMAIL_OUTBOX_ENABLED is off, so the store is always consulted.
+    """
+    try:
+        status = get_outbox().store.get(message_id)
+        if not status:
+            return jsonify({'error': 'Message not found'}), 404
+        return jsonify(status)
+    except Exception as e:
+        logger.error(f"Error reading outbox status: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/email/cache/profiles/invalidate', methods=['POST'])
+def invalidate_profile_cache():
+    """Drop cached profiles after they change; no ids clears the whole cache"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids') or []
+    if not isinstance(ids, list):
+        return jsonify({'error': 'ids must be a list'}), 400
+    return jsonify({'success': True, 'invalidated': supabase_service.profiles.invalidate(*ids)})
+
 @app.route('/api/email/health', methods=['GET'])
 def health_check():
+    breakers = {breaker.name: breaker.stats() for breaker in (smtp_breaker, supabase_service.aio.breaker)}
     return jsonify({
-        'status': 'healthy', 
+        'status': 'degraded' if any(stats['state'] != 'closed' for stats in breakers.values()) else 'healthy',
         'service': 'volunteer Email Service',
         'timestamp': datetime.utcnow().isoformat(),
         'supabase_configured': bool(SUPABASE_URL and SUPABASE_SERVICE_KEY),
@@ -1105,7 +1961,20 @@ def health_check():
             'SECRET_KEY': 'set' if os.getenv('SECRET_KEY') else 'not set'
         },
         'logo_url': LOGO_URL,
-        'logo_url_is_absolute': LOGO_URL.startswith('http')
+        'logo_url_is_absolute': LOGO_URL.startswith('http'),
+        'rate_limit': send_limiter.usage(),
+        'render_pool': render_pool.stats(),
+        'render_cache': rendered_cache.stats(),
+        'supabase_pool': supabase_service.pool_stats(),
+        'profile_cache': supabase_service.profiles.stats(),
+        'singleflight': supabase_service.aio.flights.stats(),
+        'email_log_buffer': supabase_service.log_buffer.stats(),
+        'circuit_breakers': breakers,
+        'deadlines': {'request': REQUEST_DEADLINE, 'stage_reserves': STAGE_RESERVES},
+        'outbox': {
+            'enabled': EMAIL_OUTBOX_ENABLED,
+            'counts': get_outbox().store.counts()
+        }
     }), 200
 
 @app.route('/', methods=['GET'])
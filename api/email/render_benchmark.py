@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Rendering benchmarks for the email templates.
+
+templates: renders every template (the files in templates/ plus the ones
+registered in code) with a realistic context and times each stage on its
+own - Jinja render, premailer inlining, the pre-inlined render, the text
+alternative and MIME assembly - with tracemalloc peak and net allocations.
+
+crossover: renders one template at increasing thread concurrency, both
+in-process and through the optional process pool (EMAIL_RENDER_PROCESSES),
+for each CSS mode. Reports renders per second and the lowest concurrency at
+which the pool overtakes in-process rendering.
+
+Both write a JSON report; --compare prints the change against an earlier one.
+
+Usage:
+    python render_benchmark.py templates --iterations 50 --output before.json
+    python render_benchmark.py templates --compare before.json
+    python render_benchmark.py crossover --renders 400 --concurrency 1,2,4,8,16 --processes 4
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+SAMPLE_CONTEXT = {
+    'student_name': 'Jordan Smith',
+    'student_email': 'jordan@example.com',
+    'title': 'Park Cleanup',
+    'organization': 'Parks Department',
+    'location': 'Central Park',
+    'date': '2026-10-30',
+    'time': '09:00 - 12:00',
+    'duration': '3 hours',
+    'subject': 'Reminder: Park Cleanup',
+    'preheader': 'Your volunteer opportunity is coming up'
+}
+
+# Realistic values for the variables the templates use; anything else gets a placeholder
+REALISTIC_VALUES = {
+    **SAMPLE_CONTEXT,
+    'student_id': 'S04217',
+    'activity': 'Food bank sorting shift',
+    'description': 'Sorted and packed donations for the weekend food drive',
+    'hours': 3.5,
+    'total_hours': 42,
+    'status': 'approved',
+    'notes': 'Great work - thanks for staying late to finish the pallets.',
+    'submitted_date': '2026-10-12T15:04:00',
+    'approval_date': '2026-10-14 09:30 UTC',
+    'denial_date': '2026-10-14 09:30 UTC',
+    'verification_date': '2026-10-14 09:30 UTC',
+    'registration_date': '2026-10-01',
+    'unregistration_date': '2026-10-20',
+    'verifier_email': 'coordinator@foodbank.org',
+    'admin_name': 'Morgan Lee',
+    'approve_url': 'https://volunteer-central-flax.vercel.app/verify-hours?token=1760000000:4f2a&action=approve&hours_id=9b1e',
+    'deny_url': 'https://volunteer-central-flax.vercel.app/verify-hours?token=1760000000:8c3d&action=deny&hours_id=9b1e',
+    'cancel_url': 'https://volunteer-central-flax.vercel.app/student/opportunities/unregister/51f0',
+    'share_url': 'https://volunteer-central-flax.vercel.app/profile/jordan-smith',
+    'custom_message': 'I would love for you to see what I have been up to this semester.',
+    'opportunity_title': 'Park Cleanup',
+    'opportunity_date': '2026-10-30',
+    'opportunity_time': '09:00 - 12:00',
+    'opportunity_location': 'Central Park, North Gate',
+    'opportunity_description': 'Litter pick-up and trail maintenance with the Parks Department.',
+    'days_until_event': 3
+}
+
+def template_context(module, source: str) -> Dict[str, Any]:
+    variables = module.meta.find_undeclared_variables(module.app.jinja_env.parse(source))
+    return {name: REALISTIC_VALUES.get(name, f'Sample {name}') for name in sorted(variables)}
+
+def measure(func: Callable[[], Any], iterations: int) -> Dict[str, Any]:
+    """Per-call timings in microseconds plus tracemalloc peak and net allocation of one call"""
+    func()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {
+        'mean_us': round(sum(samples) / len(samples), 1),
+        'p50_us': round(samples[len(samples) // 2], 1),
+        'p95_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+        'peak_kb': round((peak - before) / 1024, 1),
+        'allocated_kb': round((current - before) / 1024, 1)
+    }
+
+def templates(args) -> Dict[str, Any]:
+    module = load_app()
+    loader, env = module.app.jinja_env.loader, module.app.jinja_env
+    results = {}
+    for name in sorted(loader.list_templates()):
+        source = loader.get_source(env, name)[0]
+        try:
+            context = template_context(module, source)
+        except module.TemplateSyntaxError as e:
+            # password_reset.html is a Supabase Auth (Go) template; only its static HTML can be measured
+            context, html = None, source
+            report = {'jinja': f'skipped: {e.message}'}
+        else:
+            report = {}
+        with module.app.app_context():
+            if context is not None:
+                template = env.get_template(name)
+                html = template.render(**context)
+                report['jinja_render'] = measure(lambda: template.render(**context), args.iterations)
+                report['preinlined_render'] = measure(
+                    lambda: module.inlined_env.get_template(name).render(**context), args.iterations)
+                report['text_render'] = measure(
+                    lambda: module.text_env.get_template(name).render(**context), args.iterations)
+            inlined = module.transform(html, remove_classes=False)
+            report['premailer'] = measure(lambda: module.transform(html, remove_classes=False), args.iterations)
+            text = module.html_to_text(inlined)
+
+            def assemble():
+                msg = module.Message('Benchmark', sender=module.app.config['MAIL_USERNAME'],
+                                     recipients=['student@example.com'])
+                msg.html, msg.body = inlined, text
+                return msg.as_bytes()
+
+            report['mime'] = measure(assemble, args.iterations)
+            report['html_bytes'] = len(inlined.encode())
+            report['mime_bytes'] = len(assemble())
+        results[name] = report
+        stages = '  '.join(f"{stage} {value['p50_us']:.0f}us" for stage, value in report.items() if isinstance(value, dict))
+        print(f"{name:<32} {stages}", flush=True)
+    return results
+
+def compare_templates(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print p50 and peak-memory changes per template and stage"""
+    print(f"\n{'template / stage':<48} {'p50 us':>22} {'peak kb':>20}")
+    for name, stages in results.items():
+        for stage, current in stages.items():
+            before = baseline.get('results', {}).get(name, {}).get(stage)
+            if not isinstance(current, dict) or not isinstance(before, dict):
+                continue
+            old, new = before['p50_us'], current['p50_us']
+            change = f"{(new - old) / old * 100:+.0f}%" if old else 'n/a'
+            print(f"{name + ' / ' + stage:<48} {old:>8.0f}->{new:<8.0f}{change:>5} "
+                  f"{before['peak_kb']:>8.1f}->{current['peak_kb']:<8.1f}")
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def load_app():
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import flask_app
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('CSSUTILS').setLevel(logging.CRITICAL)
+    return flask_app
+
+def throughput(render: Callable[[Dict[str, Any]], Any], renders: int, concurrency: int) -> float:
+    """Renders per second with `concurrency` threads sharing `renders` jobs"""
+    contexts = [dict(SAMPLE_CONTEXT, student_name=f'Student {i}') for i in range(renders)]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(render, contexts[:concurrency]))
+        start = time.perf_counter()
+        list(pool.map(render, contexts))
+        return renders / (time.perf_counter() - start)
+
+def crossover(args) -> Dict[str, Any]:
+    module = load_app()
+    levels = [int(level) for level in args.concurrency.split(',')]
+    results = {}
+    for mode in args.modes.split(','):
+        # Spawned render workers read the mode from the environment at import
+        os.environ['EMAIL_CSS_MODE'] = mode
+        module.EMAIL_CSS_MODE = mode
+        pool = module.ProcessRenderPool(processes=args.processes)
+        pool.start()
+
+        def in_process(context):
+            with module.app.app_context():
+                return module.render_parts_in_process(args.template, context)
+
+        def pooled(context):
+            return pool.render(args.template, context)
+
+        rows = []
+        for level in levels:
+            row = {
+                'concurrency': level,
+                'in_process_rps': round(throughput(in_process, args.renders, level), 1),
+                'pool_rps': round(throughput(pooled, args.renders, level), 1)
+            }
+            rows.append(row)
+            print(f"{mode:<11} c={level:<4} in-process {row['in_process_rps']:>9.1f}/s   "
+                  f"pool {row['pool_rps']:>9.1f}/s", flush=True)
+        pool.shutdown()
+
+        # Lowest concurrency from which the pool stays ahead at every higher level
+        winner: Optional[int] = None
+        for row in reversed(rows):
+            if row['pool_rps'] <= row['in_process_rps']:
+                break
+            winner = row['concurrency']
+        results[mode] = {'levels': rows, 'crossover_concurrency': winner}
+        print(f"{mode:<11} crossover: {winner if winner else 'pool never faster'}\n")
+    return results
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Email template rendering benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    suite = commands.add_parser('templates', help='per-stage timings and allocations for every template')
+    suite.add_argument('--iterations', type=int, default=50, help='timed calls per stage')
+    suite.add_argument('--output', default='render_benchmark.json')
+    suite.add_argument('--compare', help='earlier templates report to diff against')
+
+    cross = commands.add_parser('crossover', help='in-process vs process-pool rendering throughput')
+    cross.add_argument('--template', default='opportunity_reminder.html')
+    cross.add_argument('--renders', type=int, default=200, help='renders per concurrency level')
+    cross.add_argument('--concurrency', default='1,2,4,8,16', help='comma-separated thread counts')
+    cross.add_argument('--processes', type=int, default=os.cpu_count() or 2, help='render pool size')
+    cross.add_argument('--modes', default='preinlined,transform', help='EMAIL_CSS_MODE values to compare')
+    cross.add_argument('--output', default='render_benchmark.json')
+
+    args = parser.parse_args(argv)
+    results = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'revision': git_revision(),
+            'command': args.command,
+            'arguments': {key: value for key, value in vars(args).items() if key != 'command'}
+        },
+        'results': templates(args) if args.command == 'templates' else crossover(args)
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if getattr(args, 'compare', None):
+        with open(args.compare) as f:
+            compare_templates(results['results'], json.load(f))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
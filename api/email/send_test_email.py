@@ -3,11 +3,13 @@
 Script to send a test email and verify logo configuration
 """
 
+import os
+import sys
 import requests
 import json
 import time
 
-def test_email_service():
+def test_email_service(test_email: str = None):
     """Test the email service endpoints"""
     
     base_url = "http://localhost:5000"
@@ -34,8 +36,10 @@ def test_email_service():
     # Test 2: Send test email
     print("\n2. Testing email sending...")
     
-    # You can change this email address to your own
-    test_email = input("Enter your email address to receive the test email: ").strip()
+    # Pass the address as an argument or TEST_EMAIL so the script can run unattended
+    test_email = test_email or os.getenv('TEST_EMAIL')
+    if not test_email and sys.stdin.isatty():
+        test_email = input("Enter your email address to receive the test email: ").strip()
     
     if not test_email:
         print("❌ No email address provided")
@@ -76,7 +80,7 @@ if __name__ == "__main__":
     print("Make sure the Flask app is running on http://localhost:5000")
     print()
     
-    success = test_email_service()
+    success = test_email_service(sys.argv[1] if len(sys.argv) > 1 else None)
     
     if success:
         print("\n🎉 All tests passed! The logo should be visible in your email.")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for BCC coalescing: merged envelopes reach only the real recipients and are charged per recipient,
+and the profile share only accepts a well-formed recipient list
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import flask_app
+from benchmark import SMTPSink
+from flask_mail import Message
+
+from email_common import SendRateLimiter
+
+def make_messages(count):
+    messages = []
+    for i in range(count):
+        msg = Message('Reminder', sender='sender@test.local', recipients=[f'student{i}@test.local'])
+        msg.html, msg.body = '<p>See you there</p>', 'See you there'
+        messages.append(msg)
+    return messages
+
+def test_merged_envelope_has_only_the_bcc_recipients():
+    coalesced = flask_app.coalesce_identical(make_messages(3))
+    assert len(coalesced) == 1
+    merged, indexes = coalesced[0]
+    assert indexes == [0, 1, 2]
+    assert merged.send_to == {f'student{i}@test.local' for i in range(3)}
+
+    with flask_app.app.app_context():
+        mime = merged._message()
+    assert mime.get_all('To') == ['undisclosed-recipients:;']
+    assert 'student0@test.local' not in mime.as_string()
+
+    restored = flask_app.payload_to_message(flask_app.message_to_payload(merged))
+    assert isinstance(restored, flask_app.BccMessage)
+    assert restored.send_to == merged.send_to
+
+def test_coalesced_send_issues_one_rcpt_per_recipient(monkeypatch):
+    smtp = SMTPSink()
+    threading.Thread(target=smtp.serve_forever, daemon=True).start()
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_SERVER', '127.0.0.1')
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_PORT', smtp.port)
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_USE_TLS', False)
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_USERNAME', 'sender@test.local')
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_PASSWORD', 'test')
+    flask_app.mail.init_app(flask_app.app)
+    limiter = SendRateLimiter(0, 0, 0)
+    monkeypatch.setattr(flask_app, 'send_limiter', limiter)
+
+    with flask_app.app.app_context():
+        results = flask_app.send_coalesced(make_messages(4))
+
+    assert all(result['success'] for result in results)
+    assert smtp.stats['messages'] == 1
+    assert smtp.stats['recipients'] == 4
+    assert limiter.sent == 4
+    smtp.shutdown()
+
+def test_rate_limiter_charges_every_recipient():
+    limiter = SendRateLimiter(per_second=0, burst=0, per_day=5)
+    assert limiter.acquire(max_wait=0, tokens=3) == 0
+    assert limiter.acquire(max_wait=0, tokens=3) > 0
+    assert limiter.acquire(max_wait=0, tokens=2) == 0
+    assert limiter.usage()['sent'] == 5
+
+def test_profile_share_rejects_malformed_recipient_lists():
+    client = flask_app.app.test_client()
+    share = {'student_name': 'Sam', 'student_email': 'sam@test.local', 'share_url': 'https://example.org/p/sam'}
+    for recipient_emails in ('friend@test.local', [], ['friend@test.local', 7], ['']):
+        response = client.post('/api/email/send-profile-share', json={**share, 'recipient_emails': recipient_emails})
+        assert response.status_code == 400, recipient_emails
+    assert client.post('/api/email/send-profile-share', json=share).status_code == 400
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for over-budget sends with the outbox switched off: they are deferred to the outbox store
+and their status stays answerable
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import flask_app
+from benchmark import SMTPSink
+
+from email_common import SendRateLimiter
+
+@pytest.fixture
+def over_budget(monkeypatch, tmp_path):
+    """An SMTP sink, a daily send budget that is already spent and an outbox store of our own"""
+    smtp = SMTPSink()
+    threading.Thread(target=smtp.serve_forever, daemon=True).start()
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_SERVER', '127.0.0.1')
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_PORT', smtp.port)
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_USE_TLS', False)
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_USERNAME', 'sender@test.local')
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_PASSWORD', 'test')
+    flask_app.mail.init_app(flask_app.app)
+    limiter = SendRateLimiter(per_second=0, burst=0, per_day=1)
+    limiter.acquire()
+    monkeypatch.setattr(flask_app, 'send_limiter', limiter)
+    monkeypatch.setattr(flask_app, 'EMAIL_OUTBOX_ENABLED', False)
+    monkeypatch.setattr(flask_app, 'EMAIL_OUTBOX_URL', f"sqlite:///{tmp_path / 'outbox.db'}")
+    monkeypatch.setattr(flask_app, '_outbox_worker', None)
+    yield smtp
+    if flask_app._outbox_worker is not None:
+        flask_app._outbox_worker.stop()
+    smtp.shutdown()
+
+def test_deferred_send_status_is_served_with_the_outbox_disabled(over_budget):
+    client = flask_app.app.test_client()
+
+    response = client.post('/api/email/opportunity-confirmation', json={
+        'student_email': 'sam@test.local', 'title': 'Beach Cleanup'
+    })
+
+    assert response.status_code == 202
+    status_url, = response.get_json()['status_urls']
+    status = client.get(status_url)
+    assert status.status_code == 200
+    assert status.get_json()['status'] == 'queued'
+    assert client.get('/api/email/health').get_json()['outbox']['counts'] == {'queued': 1}
+    assert over_budget.stats['messages'] == 0
+
+def test_deferred_hours_update_is_logged_as_queued_with_its_template(monkeypatch, tmp_path, over_budget):
+    monkeypatch.setattr(flask_app, 'SUPABASE_URL', '')
+    logs = []
+    monkeypatch.setattr(flask_app.supabase_service, 'log_email_sent', lambda **kwargs: logs.append(kwargs))
+
+    response = flask_app.app.test_client().post('/api/email/hours-update-notification', json={
+        'hours_id': 'hours-1', 'verifier_email': 'verifier@test.local', 'status': 'approved',
+        'student_name': 'Sam', 'student_email': 'sam@test.local'
+    })
+
+    assert response.status_code == 200
+    assert response.get_json()['queued'] is True
+    assert [(log['recipient'], log['status']) for log in logs] == [('verifier@test.local', 'queued')]
+    # The outbox writes the sent row on delivery, so the verifier email must carry its template
+    with sqlite3.connect(tmp_path / 'outbox.db') as db:
+        payloads = {tuple(payload['recipients']): payload
+                    for payload in (json.loads(row[0]) for row in db.execute('SELECT payload FROM email_outbox'))}
+    assert payloads[('verifier@test.local',)]['template'] == 'approval.html'
+    assert payloads[('verifier@test.local',)]['log_data']['student_name'] == 'Sam'
+    assert not payloads[('sam@test.local',)].get('template')
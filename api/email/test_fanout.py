@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for the opportunity fan-out: a stream is bounded by the request deadline, and the recipients
+it has no time left for are queued in the outbox
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import flask_app
+from benchmark import SMTPSink
+
+import email_common
+from email_common import SendRateLimiter
+
+def test_fanout_longer_than_deadline_queues_the_rest_in_the_outbox(monkeypatch, tmp_path):
+    smtp = SMTPSink(latency=0.2)
+    threading.Thread(target=smtp.serve_forever, daemon=True).start()
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_SERVER', '127.0.0.1')
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_PORT', smtp.port)
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_USE_TLS', False)
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_USERNAME', 'sender@test.local')
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_PASSWORD', 'test')
+    flask_app.mail.init_app(flask_app.app)
+    monkeypatch.setattr(flask_app, 'mail_dispatcher', flask_app.ParallelMailDispatcher(workers=2))
+    monkeypatch.setattr(flask_app, 'send_limiter', SendRateLimiter(0, 0, 0))
+    monkeypatch.setattr(flask_app, 'EMAIL_OUTBOX_ENABLED', False)
+    monkeypatch.setattr(flask_app, 'EMAIL_OUTBOX_URL', f"sqlite:///{tmp_path / 'outbox.db'}")
+    monkeypatch.setattr(flask_app, '_outbox_worker', None)
+    monkeypatch.setattr(flask_app, 'OPPORTUNITY_FANOUT_CHUNK_SIZE', 2)
+    # About two chunks fit in the budget; sending the whole list takes several times longer
+    monkeypatch.setattr(email_common, 'REQUEST_DEADLINE', 0.5)
+    monkeypatch.setattr(email_common, 'STAGE_RESERVES', {})
+
+    registrations = [
+        {'status': 'registered', 'profiles': {'email': f'student{i}@test.local', 'full_name': f'Student {i}'}}
+        for i in range(10)
+    ]
+    monkeypatch.setattr(flask_app.supabase_service, 'get_opportunity_with_registrants', lambda opportunity_id: {
+        'id': opportunity_id, 'title': 'Beach Cleanup', 'opportunity_registrations': registrations
+    })
+    dead_letters = []
+    monkeypatch.setattr(flask_app, 'dead_letter', lambda *args: dead_letters.append(args))
+
+    started = time.monotonic()
+    response = flask_app.app.test_client().post('/api/email/opportunity-fanout', json={
+        'opportunity_id': 'opportunity-1', 'kind': 'reminder'
+    })
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    elapsed = time.monotonic() - started
+
+    done = lines[-1]
+    assert done['done'] and done['failed'] == 0 and done['total'] == 10
+    assert 0 < done['sent'] < 10
+    assert done['sent'] + done['deferred'] == 10
+    # The stream ends within the request deadline, give or take the chunk in flight
+    assert elapsed < 1.0
+    assert not dead_letters
+
+    # The outbox delivers everyone the stream had no time left for
+    store = flask_app.get_outbox().store
+    for _ in range(100):
+        if store.counts().get('queued', 0) == 0 and smtp.stats['recipients'] == 10:
+            break
+        time.sleep(0.05)
+    assert smtp.stats['recipients'] == 10
+    flask_app.get_outbox().stop()
+    smtp.shutdown()
@@ -0,0 +1,1382 @@
+"""
+Building blocks shared by both email services (api/email and api/email-service).
+
+Text alternatives and the rendered-body cache, SMTP retry policy and send
+budgets, request deadlines and circuit breakers, and the Supabase (PostgREST)
+client with its profile cache, singleflight and write-behind email log.
+Settings are read from the environment at import, under the same names in
+both services.
+"""
+
+import asyncio
+import contextvars
+import copy
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import smtplib
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from html.parser import HTMLParser
+from typing import Awaitable, Callable, Dict, Any, Iterable, List, Optional, Tuple
+
+import httpx
+from jinja2 import BaseLoader
+
+try:
+    import fcntl
+except ImportError:  # Windows: spill files are still written, but never recovered
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+JINJA_TAG = re.compile(r'{{.*?}}|{%.*?%}|{#.*?#}', re.S)
+JINJA_PLACEHOLDER = re.compile(r'jinjatag(\d{5})x')
+
+def protect_jinja_tags(source: str) -> Tuple[str, List[str]]:
+    """Swap Jinja tags for inert placeholders that HTML tooling leaves alone"""
+    tags = []
+
+    def protect(match):
+        tags.append(match.group(0))
+        return f'jinjatag{len(tags) - 1:05d}x'
+
+    return JINJA_TAG.sub(protect, source), tags
+
+def restore_jinja_tags(text: str, tags: List[str]) -> str:
+    return JINJA_PLACEHOLDER.sub(lambda m: tags[int(m.group(1))], text)
+
+class HTMLTextConverter(HTMLParser):
+    """Flattens email HTML into readable plain text for the text/plain alternative"""
+
+    BLOCK_TAGS = {'p', 'div', 'table', 'h1', 'h2', 'h3', 'h4', 'ul', 'ol', 'hr'}
+    LINE_TAGS = {'tr', 'li', 'br'}
+    SKIP_TAGS = {'head', 'style', 'script', 'title'}
+    VOID_TAGS = {'br', 'hr', 'img', 'meta', 'link', 'input'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.skip_depth = 0
+        self.href = None
+        self.link_start = 0
+        self.key_start = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self.skip_depth:
+            self.skip_depth += tag not in self.VOID_TAGS
+            return
+        if tag in self.SKIP_TAGS or 'preheader' in (attrs.get('class') or ''):
+            self.skip_depth = 1
+            return
+        if tag in self.BLOCK_TAGS:
+            self.parts.append('\n\n')
+        elif tag in self.LINE_TAGS:
+            self.parts.append('\n')
+        if tag == 'li':
+            self.parts.append('- ')
+        elif tag == 'td':
+            self.parts.append(' ')
+            self.key_start = len(self.parts) if 'key' in (attrs.get('class') or '') else None
+        elif tag == 'a':
+            self.href = attrs.get('href')
+            self.link_start = len(self.parts)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in self.VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.skip_depth:
+            self.skip_depth -= tag not in self.VOID_TAGS
+            return
+        if tag == 'a' and self.href:
+            label = ''.join(self.parts[self.link_start:]).strip()
+            if self.href != label and not self.href.startswith('mailto:'):
+                self.parts.append(f' ({self.href})')
+            self.href = None
+        elif tag == 'td' and self.key_start is not None:
+            # Key/value rows of the .data tables read as "Key: value"
+            if not ''.join(self.parts[self.key_start:]).strip().endswith(':'):
+                self.parts.append(':')
+            self.key_start = None
+        if tag in self.BLOCK_TAGS:
+            self.parts.append('\n\n')
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(re.sub(r'\s+', ' ', data))
+
+    def text(self) -> str:
+        return tidy_text(''.join(self.parts))
+
+def tidy_text(text: str) -> str:
+    # Drop link suffixes whose URL rendered empty, trim lines, keep single blank lines
+    lines = (line.replace(' ()', '').strip() for line in text.splitlines())
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+def html_to_text(html: str) -> str:
+    converter = HTMLTextConverter()
+    converter.feed(html)
+    converter.close()
+    return converter.text()
+
+class TextSkeletonLoader(BaseLoader):
+    """Serves each template converted to a plain-text Jinja template.
+
+    The HTML is parsed once per template with its Jinja tags protected, so a
+    send only substitutes variables into the cached text skeleton.
+    """
+
+    def __init__(self, loader: BaseLoader):
+        self.loader = loader
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = self.loader.get_source(environment, template)
+        protected, tags = protect_jinja_tags(source)
+        return restore_jinja_tags(html_to_text(protected), tags), filename, uptodate
+
+    def list_templates(self):
+        return self.loader.list_templates()
+
+# Rendered bodies for resends - a retried request with the same context reuses the last render
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', '512'))
+RENDER_CACHE_TTL = float(os.getenv('RENDER_CACHE_TTL', '600'))
+
+class RenderedEmailCache:
+    """Bounded LRU of rendered (html, text) bodies keyed by template name and a hash of the context"""
+
+    def __init__(self, max_size: int = RENDER_CACHE_SIZE, ttl: float = RENDER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    @staticmethod
+    def key(template_name: str, context: Dict[str, Any]) -> str:
+        digest = hashlib.sha256(json.dumps(context, sort_keys=True, default=str).encode()).hexdigest()
+        return f"{template_name}:{digest}"
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.counters['expired'] += 1
+                self.counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return value
+
+    def put(self, key: str, value: Tuple[str, str]):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def render(self, template_name: str, context: Dict[str, Any], render: Callable[[], Tuple[str, str]],
+               volatile: Iterable[str] = ()) -> Tuple[str, str]:
+        """Return the cached render for this context, rendering on a miss.
+
+        Keys named in `volatile` (timestamps, signed links) are left out of the
+        hash, so a resend within the TTL reuses the earlier values for them.
+        A render that raises or produces an empty body is never stored.
+        """
+        if self.max_size <= 0:
+            return render()
+        key = self.key(template_name, {k: v for k, v in context.items() if k not in volatile})
+        value = self.get(key)
+        if value is None:
+            value = render()
+            if value[0]:
+                self.put(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hit_rate': round(self.counters['hits'] / lookups, 3) if lookups else 0.0,
+                **self.counters
+            }
+
+# SMTP retry settings (jittered exponential backoff for transient failures)
+SMTP_RETRY_ATTEMPTS = int(os.getenv('SMTP_RETRY_ATTEMPTS', '3'))
+SMTP_RETRY_BASE_DELAY = float(os.getenv('SMTP_RETRY_BASE_DELAY', '0.5'))
+SMTP_RETRY_MAX_DELAY = float(os.getenv('SMTP_RETRY_MAX_DELAY', '8'))
+
+def is_transient_smtp_error(error: Exception) -> bool:
+    """Dropped connections, timeouts and 4xx replies are worth retrying; 5xx are not"""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, OSError)
+
+def retry_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (1-based)"""
+    return random.uniform(0, min(SMTP_RETRY_MAX_DELAY, SMTP_RETRY_BASE_DELAY * (2 ** (attempt - 1))))
+
+# Per-request deadlines - each stage (fetch, render, send, log) gets its timeout from the time left,
+# so a slow dependency fails the request well before Vercel's 30s maxDuration kills the worker
+REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', '25'))
+DEADLINE_SEND_RESERVE = float(os.getenv('DEADLINE_SEND_RESERVE', '5'))
+DEADLINE_LOG_RESERVE = float(os.getenv('DEADLINE_LOG_RESERVE', '1'))
+SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', '10'))
+
+# Seconds a stage must leave for the stages after it
+STAGE_RESERVES = {
+    'fetch': DEADLINE_SEND_RESERVE + DEADLINE_LOG_RESERVE,
+    'update': DEADLINE_SEND_RESERVE + DEADLINE_LOG_RESERVE,
+    'render': DEADLINE_SEND_RESERVE + DEADLINE_LOG_RESERVE,
+    'send': DEADLINE_LOG_RESERVE,
+    'log': 0.0
+}
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded before {stage}")
+        self.stage = stage
+
+class Deadline:
+    """Wall-clock budget for one request"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = REQUEST_DEADLINE if seconds is None else seconds
+        self.expires_at = time.monotonic() + self.seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget(self, stage: str, cap: float) -> float:
+        """Timeout for one call in `stage`: at most `cap`, leaving the later stages their reserve"""
+        left = self.remaining() - STAGE_RESERVES.get(stage, 0.0)
+        if left <= 0:
+            raise DeadlineExceeded(stage)
+        return min(cap, left)
+
+current_deadline: contextvars.ContextVar = contextvars.ContextVar('request_deadline', default=None)
+
+def stage_timeout(stage: str, cap: float) -> float:
+    """`cap`, cut down to the current request's remaining budget when there is one"""
+    deadline = current_deadline.get()
+    return cap if deadline is None else deadline.budget(stage, cap)
+
+def stage_budget_left(stage: str) -> float:
+    """Seconds the current request has left for `stage` (infinite without a deadline, never negative)"""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return float('inf')
+    return max(0.0, deadline.remaining() - STAGE_RESERVES.get(stage, 0.0))
+
+def check_deadline(stage: str):
+    """Raise DeadlineExceeded when the current request has no time left for `stage`"""
+    stage_timeout(stage, float('inf'))
+
+def run_with_deadline(deadline: Optional[Deadline], func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Call `func` under `deadline` - for work handed to another thread"""
+    token = current_deadline.set(deadline)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        current_deadline.reset(token)
+
+def init_request_deadlines(app):
+    """Give every request of a Flask app its own Deadline"""
+    @app.before_request
+    def start_request_deadline():
+        current_deadline.set(Deadline())
+
+    @app.teardown_request
+    def clear_request_deadline(exc=None):
+        current_deadline.set(None)
+
+# Circuit breakers - stop calling a dependency that keeps failing, and probe it again later
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and fails calls fast.
+
+    After `reset_timeout` a single trial call is let through (half-open); its
+    outcome closes the circuit again or re-opens it for another period.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+        self.counters = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go ahead now"""
+        with self._lock:
+            if self.state == 'closed':
+                return
+            retry_after = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == 'open' and retry_after <= 0:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial:
+                self._trial = True
+                return
+            self.counters['rejected'] += 1
+        raise CircuitOpenError(self.name, max(0.0, retry_after))
+
+    def record(self, success: bool):
+        with self._lock:
+            self._trial = False
+            if success:
+                self.counters['successes'] += 1
+                self.state = 'closed'
+                self.failures = 0
+                return
+            self.counters['failures'] += 1
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.counters['opened'] += 1
+                logger.warning(f"{self.name} circuit opened after {self.failures} consecutive failures")
+
+    @contextmanager
+    def call(self, is_failure: Callable[[BaseException], bool] = lambda e: True):
+        """Guard one call; exceptions for which `is_failure` is false count as successes"""
+        self.allow()
+        try:
+            yield
+        except BaseException as e:
+            self.record(not is_failure(e))
+            raise
+        self.record(True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout,
+                'retry_after': round(max(0.0, self.opened_at + self.reset_timeout - time.monotonic()), 1)
+                               if self.state == 'open' else 0.0,
+                **self.counters
+            }
+
+# Provider quotas (0 disables a limit); sends over budget are deferred, not failed
+SMTP_RATE_PER_SECOND = float(os.getenv('SMTP_RATE_PER_SECOND', '5'))
+SMTP_RATE_BURST = float(os.getenv('SMTP_RATE_BURST', '10'))
+SMTP_RATE_PER_DAY = float(os.getenv('SMTP_RATE_PER_DAY', '2000'))
+SMTP_RATE_MAX_WAIT = float(os.getenv('SMTP_RATE_MAX_WAIT', '2'))
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float, tokens: float = 1) -> float:
+        """Seconds until `tokens` can be taken; a request larger than the bucket waits for a full one"""
+        self._refill(now)
+        needed = min(tokens, self.capacity)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+class SendRateLimiter:
+    """Per-second and per-day send budgets shared by every send path in the process"""
+
+    def __init__(self, per_second: float = SMTP_RATE_PER_SECOND, burst: float = SMTP_RATE_BURST,
+                 per_day: float = SMTP_RATE_PER_DAY):
+        self.buckets = {}
+        if per_second > 0:
+            self.buckets['per_second'] = TokenBucket(per_second, max(1.0, burst))
+        if per_day > 0:
+            self.buckets['per_day'] = TokenBucket(per_day / 86400.0, per_day)
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.deferred = 0
+
+    def reserve(self, tokens: int = 1) -> float:
+        """Take `tokens` (one per recipient) if every budget allows it; otherwise return the seconds to wait.
+
+        A send bigger than a bucket drives it negative, so the following sends pay for it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max((bucket.wait_time(now, tokens) for bucket in self.buckets.values()), default=0.0)
+            if wait == 0:
+                for bucket in self.buckets.values():
+                    bucket.tokens -= tokens
+                self.sent += tokens
+            return wait
+
+    def acquire(self, max_wait: float = SMTP_RATE_MAX_WAIT, tokens: int = 1) -> float:
+        """Block for `tokens` up to max_wait; returns 0 on success or the remaining wait.
+
+        The wait is also cut down to the current request's send budget, so a
+        send never sleeps past the request deadline.
+        """
+        give_up_at = time.monotonic() + min(max_wait, stage_budget_left('send'))
+        while True:
+            wait = self.reserve(tokens)
+            if wait == 0:
+                return 0.0
+            if time.monotonic() + wait > give_up_at:
+                with self._lock:
+                    self.deferred += 1
+                return wait
+            time.sleep(wait)
+
+    def usage(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            budgets = {}
+            for name, bucket in self.buckets.items():
+                bucket._refill(now)
+                budgets[name] = {
+                    'limit': bucket.capacity if name == 'per_day' else bucket.rate,
+                    'available': round(bucket.tokens, 2),
+                    'used': round(bucket.capacity - bucket.tokens, 2)
+                }
+            return {'budgets': budgets, 'sent': self.sent, 'deferred': self.deferred}
+
+# Singleflight - bulk approvals fire many identical reads at once; concurrent callers share one request
+class SingleFlight:
+    """Runs one call per key at a time and shares its outcome with every concurrent caller.
+
+    The call runs as its own task, so a caller that is cancelled doesn't
+    cancel it for the others. Callers that shared a result each get a deep
+    copy, so none of them can see another's changes. Used on one event loop;
+    stats() may be read from any thread.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Any, Dict[str, Any]] = {}
+        self.counters = {'calls': 0, 'executed': 0, 'deduplicated': 0, 'shared_errors': 0}
+
+    async def do(self, key: Any, call: Callable[[], Awaitable[Any]]) -> Any:
+        self.counters['calls'] += 1
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight['callers'] += 1
+            self.counters['deduplicated'] += 1
+        else:
+            flight = self._flights[key] = {'callers': 1}
+            self.counters['executed'] += 1
+            flight['task'] = asyncio.ensure_future(self._run(key, flight, call))
+        try:
+            result = await asyncio.shield(flight['task'])
+        except Exception:
+            if flight['callers'] > 1:
+                self.counters['shared_errors'] += 1
+            raise
+        return result if flight['callers'] == 1 else copy.deepcopy(result)
+
+    async def _run(self, key: Any, flight: Dict[str, Any], call: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            return await call()
+        finally:
+            # Later callers start a fresh call rather than joining a finished one
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        counters = dict(self.counters)
+        return {
+            'inflight': len(self._flights),
+            'dedup_rate': round(counters['deduplicated'] / counters['calls'], 3) if counters['calls'] else 0.0,
+            **counters
+        }
+
+# Profiles by id - reminder waves and approval sessions look up the same people repeatedly
+PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', '1024'))
+PROFILE_CACHE_TTL = float(os.getenv('PROFILE_CACHE_TTL', '300'))
+PROFILE_CACHE_NEGATIVE_TTL = float(os.getenv('PROFILE_CACHE_NEGATIVE_TTL', '30'))
+
+class ProfileCache:
+    """Bounded LRU of profiles by id with a TTL and short-lived entries for missing ids.
+
+    Concurrent misses on one id are not coalesced here: the fetch goes through
+    AsyncSupabaseClient.get_one, whose SingleFlight already shares one request.
+    """
+
+    def __init__(self, max_size: int = PROFILE_CACHE_SIZE, ttl: float = PROFILE_CACHE_TTL,
+                 negative_ttl: float = PROFILE_CACHE_NEGATIVE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0}
+
+    async def get(self, profile_id: str, fetch: Callable[[], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """Return the cached profile (or cached absence), awaiting `fetch()` on a miss.
+
+        `fetch` returns None for an id that does not exist and raises on errors,
+        which are never cached. Lookups all run on the service's event loop;
+        invalidate() and stats() may be called from any thread.
+        """
+        if self.max_size <= 0:
+            return await fetch()
+        key = str(profile_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, profile = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.counters['hits' if profile is not None else 'negative_hits'] += 1
+                    return dict(profile) if profile is not None else None
+                del self._entries[key]
+                self.counters['expired'] += 1
+            self.counters['misses'] += 1
+            generation = self.counters['invalidations']
+
+        profile = await fetch()
+        with self._lock:
+            # A profile invalidated mid-fetch may be stale; hand it to the caller but don't keep it
+            if generation == self.counters['invalidations']:
+                self._store(key, profile)
+        return dict(profile) if profile is not None else None
+
+    def _store(self, key: str, profile: Optional[Dict[str, Any]]):
+        ttl = self.ttl if profile is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, profile)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def invalidate(self, *profile_ids: str) -> int:
+        """Drop the given ids, or everything when none are given; returns how many entries went"""
+        with self._lock:
+            self.counters['invalidations'] += 1
+            if not profile_ids:
+                dropped = len(self._entries)
+                self._entries.clear()
+                return dropped
+            return sum(self._entries.pop(str(profile_id), None) is not None for profile_id in profile_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.counters['hits'] + self.counters['negative_hits']
+            lookups = hits + self.counters['misses']
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'negative_ttl': self.negative_ttl,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                **self.counters
+            }
+
+# email_logs rows are written behind the response, several per POST (batch size 0 writes each row inline)
+EMAIL_LOG_BATCH_SIZE = int(os.getenv('EMAIL_LOG_BATCH_SIZE', '50'))
+EMAIL_LOG_FLUSH_INTERVAL = float(os.getenv('EMAIL_LOG_FLUSH_INTERVAL', '2'))
+EMAIL_LOG_SPILL_DIR = os.getenv('EMAIL_LOG_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'email-log-spill'))
+
+class EmailLogBuffer:
+    """Write-behind buffer for email_logs rows.
+
+    Rows are appended to this buffer's spill file as they arrive and
+    inserted as one array POST when the batch fills, when the flush interval
+    passes, or at shutdown. The spill file is rewritten after every
+    successful flush; spill files left behind by exited processes are picked
+    up and re-sent on start.
+
+    Each buffer names its files after a random id and holds an exclusive
+    lock on its .lock file while it runs. The OS drops that lock when the
+    process exits, so PID reuse and container restarts can't make a dead
+    writer look alive.
+    """
+
+    def __init__(self, insert: Callable[[List[Dict[str, Any]]], None], batch_size: int = EMAIL_LOG_BATCH_SIZE,
+                 flush_interval: float = EMAIL_LOG_FLUSH_INTERVAL, spill_dir: str = EMAIL_LOG_SPILL_DIR):
+        self.insert = insert
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_dir = spill_dir
+        self.instance_id = uuid.uuid4().hex
+        self.spill_path = os.path.join(spill_dir, f'email-logs-{self.instance_id}.jsonl') if spill_dir else None
+        self._spill_lock = None
+        self._rows: List[Dict[str, Any]] = []
+        self._oldest: Optional[float] = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.counters = {'buffered': 0, 'flushed': 0, 'batches': 0, 'failed_flushes': 0, 'recovered': 0}
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None or self.batch_size <= 0:
+                return
+            self._thread = threading.Thread(target=self._run, name='email-log-writer', daemon=True)
+            self._thread.start()
+            self._lock_spill()
+        self.recover()
+
+    def _lock_path(self, instance_id: str) -> str:
+        return os.path.join(self.spill_dir, f'email-logs-{instance_id}.lock')
+
+    def _lock_spill(self):
+        """Hold our lock file for the life of the process, marking our spill files as in use"""
+        if not self.spill_path or fcntl is None:
+            return
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._spill_lock = open(self._lock_path(self.instance_id), 'a')
+            fcntl.flock(self._spill_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            logger.warning(f"Could not lock email log spill file: {str(e)}")
+
+    def add(self, row: Dict[str, Any]):
+        if self.batch_size <= 0:
+            self.insert([row])
+            return
+        self.start()
+        with self._cond:
+            self._rows.append(row)
+            self._oldest = self._oldest or time.monotonic()
+            self.counters['buffered'] += 1
+            self._spill([row], mode='a')
+            # Wake the writer to start the flush timer on the first row, or to flush a full batch
+            if len(self._rows) == 1 or len(self._rows) >= self.batch_size:
+                self._cond.notify()
+
+    def _spill(self, rows: List[Dict[str, Any]], mode: str):
+        if not self.spill_path:
+            return
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            if mode == 'a':
+                with open(self.spill_path, 'a') as f:
+                    f.writelines(json.dumps(row) + '\n' for row in rows)
+                return
+            temp_path = f'{self.spill_path}.tmp'
+            with open(temp_path, 'w') as f:
+                f.writelines(json.dumps(row) + '\n' for row in rows)
+            os.replace(temp_path, self.spill_path)
+        except OSError as e:
+            logger.warning(f"Could not write email log spill file: {str(e)}")
+
+    def recover(self):
+        """Re-buffer rows from spill files whose writer has exited.
+
+        A writer's lock can only be taken once its process is gone. While
+        holding it, the file is claimed by renaming it under this buffer's own
+        id. The rename is atomic, so exactly one process replays each file. A
+        claimed file left by a recoverer that died is itself recovered later.
+        """
+        if not self.spill_path or fcntl is None or not os.path.isdir(self.spill_dir):
+            return
+        for name in sorted(os.listdir(self.spill_dir)):
+            match = re.fullmatch(r'email-logs-([0-9a-f]{32})(\.claimed-[0-9a-f]{32})?\.jsonl', name)
+            if not match or match.group(1) == self.instance_id:
+                continue
+            claimed = os.path.join(self.spill_dir, f'email-logs-{self.instance_id}.claimed-{uuid.uuid4().hex}.jsonl')
+            lock_path = self._lock_path(match.group(1))
+            try:
+                with open(lock_path, 'a') as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    os.rename(os.path.join(self.spill_dir, name), claimed)
+                    os.remove(lock_path)
+            except (BlockingIOError, FileNotFoundError):
+                # The writer is still running, or another process claimed the file first
+                continue
+            except OSError as e:
+                logger.warning(f"Could not claim email log spill file {name}: {str(e)}")
+                continue
+            try:
+                with open(claimed) as f:
+                    rows = [json.loads(line) for line in f if line.strip()]
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not recover email log spill file {name}: {str(e)}")
+                continue
+            with self._cond:
+                self._rows.extend(rows)
+                self._oldest = self._oldest or time.monotonic()
+                self.counters['recovered'] += len(rows)
+                self._spill(rows, mode='a')
+                self._cond.notify()
+            os.remove(claimed)
+            if rows:
+                logger.info(f"Recovered {len(rows)} unwritten email log row(s) from {name}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._rows or (
+                        len(self._rows) < self.batch_size
+                        and time.monotonic() - self._oldest < self.flush_interval)):
+                    self._cond.wait(self.flush_interval - (time.monotonic() - self._oldest) if self._rows else None)
+                if self._closed:
+                    return
+            if not self.flush():
+                # PostgREST is unhappy; rows stay buffered (and spilled) until the next interval
+                time.sleep(self.flush_interval)
+
+    def flush(self) -> bool:
+        """Insert everything buffered so far; on failure the rows are kept for the next attempt"""
+        with self._flush_lock:
+            with self._cond:
+                rows, self._rows, self._oldest = self._rows, [], None
+            if not rows:
+                return True
+            try:
+                for start in range(0, len(rows), max(1, self.batch_size)):
+                    self.insert(rows[start:start + max(1, self.batch_size)])
+                    self.counters['batches'] += 1
+            except Exception as e:
+                logger.error(f"Failed to write {len(rows)} email log row(s): {str(e)}")
+                with self._cond:
+                    self._rows = rows[start:] + self._rows
+                    self._oldest = time.monotonic()
+                    self.counters['flushed'] += start
+                    self.counters['failed_flushes'] += 1
+                    self._spill(self._rows, mode='w')
+                return False
+            with self._cond:
+                self.counters['flushed'] += len(rows)
+                self._spill(self._rows, mode='w')
+            return True
+
+    def close(self):
+        """Flush what is left and stop the writer thread (registered with atexit)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval + 1)
+        if self.flush() and self._spill_lock is not None:
+            # Nothing left to recover: clean up rather than leave files for the next start
+            for path in (self.spill_path, self._lock_path(self.instance_id)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._spill_lock.close()
+            self._spill_lock = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'batch_size': self.batch_size,
+                'flush_interval': self.flush_interval,
+                'pending': len(self._rows),
+                **self.counters
+            }
+
+# Durable outbox of pending sends, shared by worker processes through one database
+class OutboxStore:
+    """SQL-backed outbox table. Subclasses provide the connection and placeholder style.
+
+    Rows move queued -> sending -> sent, or back to queued with a later
+    next_attempt_at on failure, and finally to failed after max attempts.
+    A 'sending' row whose lease has expired is picked up again, so a worker
+    crash never loses a message.
+    """
+
+    placeholder = '?'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at DOUBLE PRECISION NOT NULL,
+            last_error TEXT,
+            created_at DOUBLE PRECISION NOT NULL,
+            updated_at DOUBLE PRECISION NOT NULL
+        )
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.cursor().execute(self.SCHEMA)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _connect(self):
+        raise NotImplementedError
+
+    def _execute(self, sql: str, params: tuple = (), fetch: bool = False):
+        sql = sql.replace('?', self.placeholder)
+        with self._lock:
+            conn = self._connect()
+            try:
+                cur = conn.cursor()
+                cur.execute(sql, params)
+                rows = cur.fetchall() if fetch else None
+                conn.commit()
+                return rows
+            finally:
+                conn.close()
+
+    def enqueue(self, payload: Dict[str, Any], delay: float = 0) -> str:
+        message_id = str(uuid.uuid4())
+        now = time.time()
+        self._execute(
+            "INSERT INTO email_outbox (id, payload, status, attempts, next_attempt_at, created_at, updated_at) "
+            "VALUES (?, ?, 'queued', 0, ?, ?, ?)",
+            (message_id, json.dumps(payload), now + delay, now, now)
+        )
+        return message_id
+
+    def claim(self, limit: int, lease: float) -> List[Dict[str, Any]]:
+        """Lease up to `limit` due messages to the calling worker.
+
+        The select and the lease update run in one write transaction, so
+        workers in other processes sharing the store never claim the same row.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                cur = conn.cursor()
+                self._begin_claim(cur)
+                cur.execute(
+                    self._claim_sql().replace('?', self.placeholder),
+                    (now, limit)
+                )
+                rows = cur.fetchall()
+                ids = [row[0] for row in rows]
+                if ids:
+                    marks = ', '.join([self.placeholder] * len(ids))
+                    cur.execute(
+                        f"UPDATE email_outbox SET status = 'sending', attempts = attempts + 1, "
+                        f"next_attempt_at = {self.placeholder}, updated_at = {self.placeholder} WHERE id IN ({marks})",
+                        (now + lease, now, *ids)
+                    )
+                conn.commit()
+            finally:
+                conn.close()
+        return [
+            {'id': row[0], 'payload': json.loads(row[1]), 'attempts': row[2] + 1}
+            for row in rows
+        ]
+
+    def _begin_claim(self, cur):
+        """Open the claim transaction (Postgres locks the selected rows itself)"""
+
+    def _claim_sql(self) -> str:
+        return (
+            "SELECT id, payload, attempts FROM email_outbox "
+            "WHERE status IN ('queued', 'sending') AND next_attempt_at <= ? "
+            "ORDER BY next_attempt_at LIMIT ?"
+        )
+
+    def mark_sent(self, message_id: str):
+        now = time.time()
+        self._execute(
+            "UPDATE email_outbox SET status = 'sent', last_error = NULL, updated_at = ? WHERE id = ?",
+            (now, message_id)
+        )
+
+    def mark_failed(self, message_id: str, error: str, retry_at: Optional[float]):
+        """Reschedule the message, or fail it permanently when retry_at is None"""
+        now = time.time()
+        if retry_at is None:
+            self._execute(
+                "UPDATE email_outbox SET status = 'failed', last_error = ?, updated_at = ? WHERE id = ?",
+                (error, now, message_id)
+            )
+        else:
+            self._execute(
+                "UPDATE email_outbox SET status = 'queued', last_error = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                (error, retry_at, now, message_id)
+            )
+
+    def release(self, message_id: str, retry_at: float):
+        """Put a claimed message back without counting the attempt (e.g. rate limited)"""
+        self._execute(
+            "UPDATE email_outbox SET status = 'queued', attempts = attempts - 1, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+            (retry_at, time.time(), message_id)
+        )
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute(
+            "SELECT id, status, attempts, last_error, created_at, updated_at, next_attempt_at "
+            "FROM email_outbox WHERE id = ?",
+            (message_id,), fetch=True
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            'id': row[0],
+            'status': row[1],
+            'attempts': row[2],
+            'last_error': row[3],
+            'created_at': datetime.utcfromtimestamp(row[4]).isoformat(),
+            'updated_at': datetime.utcfromtimestamp(row[5]).isoformat(),
+            'next_attempt_at': datetime.utcfromtimestamp(row[6]).isoformat() if row[1] == 'queued' else None
+        }
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._execute("SELECT status, COUNT(*) FROM email_outbox GROUP BY status", fetch=True)
+        return {status: count for status, count in rows}
+
+class SQLiteOutboxStore(OutboxStore):
+    def __init__(self, path: str):
+        self.path = path
+        super().__init__()
+        self._execute("PRAGMA journal_mode=WAL", fetch=True)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _begin_claim(self, cur):
+        # Take the write lock before selecting; other writers wait on it (up to the 30s busy timeout)
+        cur.execute("BEGIN IMMEDIATE")
+
+class PostgresOutboxStore(OutboxStore):
+    """Outbox in Postgres; concurrent workers claim rows with SKIP LOCKED"""
+
+    placeholder = '%s'
+
+    def __init__(self, dsn: str):
+        import psycopg2  # optional dependency, only needed for a Postgres outbox
+        self._psycopg2 = psycopg2
+        self.dsn = dsn
+        super().__init__()
+
+    def _connect(self):
+        return self._psycopg2.connect(self.dsn)
+
+    def _claim_sql(self) -> str:
+        return super()._claim_sql() + " FOR UPDATE SKIP LOCKED"
+
+def create_outbox_store(url: str) -> OutboxStore:
+    if url.startswith('sqlite:///'):
+        return SQLiteOutboxStore(url[len('sqlite:///'):])
+    if url.startswith(('postgres://', 'postgresql://')):
+        return PostgresOutboxStore(url)
+    raise ValueError(f"Unsupported outbox URL: {url}")
+
+# PostgREST connections - one async client and keep-alive pool shared by every request thread
+SUPABASE_POOL_SIZE = int(os.getenv('SUPABASE_POOL_SIZE', '10'))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv('SUPABASE_CONNECT_TIMEOUT', '3.05'))
+SUPABASE_READ_TIMEOUT = float(os.getenv('SUPABASE_READ_TIMEOUT', '10'))
+
+class EventLoopThread:
+    """A background asyncio loop that synchronous code hands coroutines to"""
+
+    def __init__(self, name: str = 'supabase-io'):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # A forked worker inherits the loop object but not its thread
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+                self._loop, self._pid = loop, os.getpid()
+            return self._loop
+
+    def run(self, coro: Awaitable[Any]) -> Any:
+        """Run a coroutine on the loop and block until it finishes.
+
+        The coroutine sees the caller's context variables, so the request
+        deadline carries over to the loop.
+        """
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError('Blocking Supabase call made on the event loop; await the async method instead')
+        context = contextvars.copy_context()
+
+        async def in_caller_context():
+            for var, value in context.items():
+                var.set(value)
+            return await coro
+
+        return asyncio.run_coroutine_threadsafe(in_caller_context(), loop).result()
+
+# Field specs - the columns each query returns (select=). An embedded resource is a
+# (name, fields) pair; only what the templates, routes and verify-hours page read is fetched.
+HOURS_FIELDS = ('id', 'student_id', 'hours', 'date', 'description', 'status', 'created_at')
+PROFILE_FIELDS = ('id', 'full_name', 'email', 'student_id', 'role')
+# volunteer_hours also references profiles via approved_by, so the embed names its foreign key
+HOURS_WITH_STUDENT_FIELDS = HOURS_FIELDS + (('profiles!student_id', PROFILE_FIELDS),)
+FAILED_EMAIL_FIELDS = ('id', 'recipient', 'template', 'subject', 'data', 'created_at')
+
+def select_fields(fields: Tuple[Any, ...]) -> str:
+    """Render a field spec as a PostgREST select= list"""
+    return ','.join(field if isinstance(field, str) else f"{field[0]}({select_fields(field[1])})"
+                    for field in fields)
+
+# Single-row reads come back as an object (406 when no row matches); writes skip the echo
+SINGLE_OBJECT = {'Accept': 'application/vnd.pgrst.object+json'}
+RETURN_MINIMAL = {'Prefer': 'return=minimal'}
+
+class AsyncSupabaseClient:
+    """PostgREST client on asyncio and httpx, with the tables both services use.
+
+    Independent calls can be awaited together (asyncio.gather) and share one
+    keep-alive connection pool. Everything runs on a single event loop -
+    get_one coalesces identical reads with tasks bound to it. Each service
+    subclasses it with its own queries.
+    """
+
+    def __init__(self, url: str, service_key: str, pool_size: int = SUPABASE_POOL_SIZE,
+                 timeout: Tuple[float, float] = (SUPABASE_CONNECT_TIMEOUT, SUPABASE_READ_TIMEOUT)):
+        self.url = url
+        self.service_key = service_key
+        self.headers = {
+            'apikey': self.service_key,
+            'Authorization': f'Bearer {self.service_key}',
+            'Content-Type': 'application/json'
+        }
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self.profiles = ProfileCache()
+        self.flights = SingleFlight()
+        self.log_buffer: Optional[EmailLogBuffer] = None
+        self.breaker = CircuitBreaker('supabase')
+        self.counters = {'requests': 0, 'errors': 0, 'connections_opened': 0}
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            )
+        return self._client
+    
+    async def _trace(self, event: str, info: Dict[str, Any]):
+        if event == 'connection.connect_tcp.complete':
+            self.counters['connections_opened'] += 1
+    
+    async def request(self, method: str, table: str, stage: str = None, **kwargs) -> httpx.Response:
+        """Send one PostgREST request within the stage's share of the request deadline.
+
+        Transport errors and 5xx responses count against the circuit breaker,
+        which raises CircuitOpenError while PostgREST is considered down.
+        """
+        timeout = stage_timeout(stage or ('fetch' if method == 'GET' else 'log'), self.timeout[1])
+        self.breaker.allow()
+        self.counters['requests'] += 1
+        try:
+            response = await self.client.request(
+                method, f"{self.url}/rest/v1/{table}",
+                timeout=httpx.Timeout(timeout, connect=min(self.timeout[0], timeout)),
+                extensions={'trace': self._trace}, **kwargs
+            )
+        except BaseException:
+            self.counters['errors'] += 1
+            self.breaker.record(False)
+            raise
+        self.breaker.record(response.status_code < 500)
+        return response
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        # httpx has no public pool introspection; read httpcore's connection list when it is there
+        pool = getattr(getattr(self._client, '_transport', None), '_pool', None)
+        connections = list(getattr(pool, 'connections', []))
+        counters = dict(self.counters)
+        return {
+            'client': 'httpx',
+            'size': self.pool_size,
+            'timeout': {'connect': self.timeout[0], 'read': self.timeout[1]},
+            'open': len(connections),
+            'idle': sum(1 for connection in connections if connection.is_idle()),
+            'reused': max(0, counters['requests'] - counters['errors'] - counters['connections_opened']),
+            **counters
+        }
+    
+    async def get_one(self, table: str, row_id: str, fields: Tuple[Any, ...]) -> Optional[Dict[str, Any]]:
+        """Fetch one row by ID as an object; None when it does not exist, raises on request errors.
+
+        Concurrent reads of the same row and fields share one request.
+        """
+        select = select_fields(fields)
+        return await self.flights.do((table, str(row_id), select), lambda: self._get_one(table, row_id, select))
+    
+    async def _get_one(self, table: str, row_id: str, select: str) -> Optional[Dict[str, Any]]:
+        response = await self.request(
+            'GET', table,
+            params={'id': f'eq.{row_id}', 'select': select},
+            headers=SINGLE_OBJECT
+        )
+        if response.status_code == 406:
+            return None
+        response.raise_for_status()
+        return response.json()
+    
+    async def _fetch_profile(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        return await self.get_one('profiles', profile_id, PROFILE_FIELDS)
+    
+    async def get_hours_by_id(self, hours_id: str) -> Optional[Dict[str, Any]]:
+        """Get volunteer hours by ID"""
+        try:
+            return await self.get_one('volunteer_hours', hours_id, HOURS_FIELDS)
+        except Exception as e:
+            logger.error(f"Failed to get hours: {str(e)}")
+            return None
+    
+    async def update_hours_status(self, hours_id: str, status: str, verified_by: str, notes: str = None) -> bool:
+        """Update volunteer hours status"""
+        try:
+            update_data = {
+                'status': status,
+                'verified_by': verified_by,
+                'verification_date': datetime.utcnow().isoformat(),
+                'verification_notes': notes,
+                'updated_at': datetime.utcnow().isoformat()
+            }
+            
+            response = await self.request(
+                'PATCH', f"volunteer_hours?id=eq.{hours_id}",
+                stage='update',
+                json=update_data,
+                headers=RETURN_MINIMAL
+            )
+            response.raise_for_status()
+            
+            logger.info(f"Hours {hours_id} status updated to {status}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to update hours status: {str(e)}")
+            return False
+    
+    async def get_student_profile(self, student_id: str) -> Optional[Dict[str, Any]]:
+        """Get student profile by ID"""
+        try:
+            return await self.profiles.get(student_id, lambda: self._fetch_profile(student_id))
+        except Exception as e:
+            logger.error(f"Failed to get student profile: {str(e)}")
+            return None
+    
+    async def get_hours_with_student(self, hours_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Get volunteer hours and the student's profile in one request (embedded via student_id)"""
+        try:
+            hours_data = await self.get_one('volunteer_hours', hours_id, HOURS_WITH_STUDENT_FIELDS)
+            if not hours_data:
+                return None, None
+            return hours_data, hours_data.pop('profiles', None)
+        except Exception as e:
+            logger.error(f"Failed to get hours with student: {str(e)}")
+            return None, None
+    
+    async def log_email_sent(self, recipient: str, template: str, subject: str, data: Dict[str, Any],
+                             status: str = 'sent') -> bool:
+        """Log email sent (or queued for later) to database (buffered; see EmailLogBuffer)"""
+        try:
+            log_data = {
+                'recipient': recipient,
+                'template': template,
+                'subject': subject,
+                'data': json.dumps(data),
+                'status': status,
+                'sent_at': datetime.utcnow().isoformat()
+            }
+            
+            if self.log_buffer is None or self.log_buffer.batch_size <= 0:
+                await self.insert_email_logs([log_data])
+            else:
+                self.log_buffer.add(log_data)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to log email: {str(e)}")
+            return False
+    
+    async def insert_email_logs(self, rows: List[Dict[str, Any]]):
+        """Insert email_logs rows in one request; raises on failure"""
+        response = await self.request('POST', 'email_logs', json=rows, headers=RETURN_MINIMAL)
+        response.raise_for_status()
+    
+    async def log_email_failed(self, recipient: str, template: str, subject: str, message: Dict[str, Any], error: str) -> bool:
+        """Dead-letter a failed email, keeping the rendered message so it can be replayed"""
+        try:
+            log_data = {
+                'recipient': recipient,
+                'template': template,
+                'subject': subject,
+                'data': json.dumps({'message': message}),
+                'status': 'failed',
+                'error': error
+            }
+            
+            response = await self.request('POST', 'email_logs', json=log_data, headers=RETURN_MINIMAL)
+            response.raise_for_status()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to dead-letter email: {str(e)}")
+            return False
+    
+    async def get_failed_emails(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get dead-lettered emails, oldest first"""
+        try:
+            response = await self.request(
+                'GET', 'email_logs',
+                params={
+                    'status': 'eq.failed',
+                    'order': 'created_at.asc',
+                    'limit': limit,
+                    'select': select_fields(FAILED_EMAIL_FIELDS)
+                }
+            )
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Failed to get failed emails: {str(e)}")
+            return []
+    
+    async def mark_email_sent(self, log_id: int) -> bool:
+        """Mark a dead-lettered email as sent after a successful replay"""
+        try:
+            response = await self.request(
+                'PATCH', f"email_logs?id=eq.{log_id}",
+                json={'status': 'sent', 'sent_at': datetime.utcnow().isoformat(), 'error': None},
+                headers=RETURN_MINIMAL
+            )
+            response.raise_for_status()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to mark email {log_id} as sent: {str(e)}")
+            return False
+    
+    async def get_admin_profile(self, admin_id: str) -> Optional[Dict[str, Any]]:
+        """Get admin profile by ID"""
+        try:
+            return await self.profiles.get(admin_id, lambda: self._fetch_profile(admin_id))
+        except Exception as e:
+            logger.error(f"Failed to get admin profile: {str(e)}")
+            return None
+    
+    async def log_admin_activity(self, admin_id: str, action: str, details: Dict[str, Any]) -> bool:
+        """Log admin activity"""
+        try:
+            log_data = {
+                'admin_id': admin_id,
+                'action': action,
+                'details': json.dumps(details),
+                'timestamp': datetime.utcnow().isoformat()
+            }
+            
+            response = await self.request('POST', 'admin_activity_logs', json=log_data, headers=RETURN_MINIMAL)
+            response.raise_for_status()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to log admin activity: {str(e)}")
+            return False
+
+class SupabaseClient:
+    """Blocking facade over an AsyncSupabaseClient for code that is not async.
+
+    Each method runs its async counterpart on the shared background loop;
+    gather() runs several of them concurrently, e.g.
+    supabase_service.gather(aio.get_hours_with_student(hours_id), aio.get_admin_profile(admin_id)).
+    """
+
+    def __init__(self, aio: AsyncSupabaseClient):
+        self.aio = aio
+        self.io = EventLoopThread()
+        self.url = self.aio.url
+        self.profiles = self.aio.profiles
+        self.log_buffer = EmailLogBuffer(self.insert_email_logs)
+        self.aio.log_buffer = self.log_buffer
+    
+    def gather(self, *calls: Awaitable[Any]) -> List[Any]:
+        """Run independent async calls concurrently; results come back in call order"""
+        async def run_all():
+            return list(await asyncio.gather(*calls))
+        return self.io.run(run_all())
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        return self.aio.pool_stats()
+    
+    def get_hours_by_id(self, hours_id: str) -> Optional[Dict[str, Any]]:
+        return self.io.run(self.aio.get_hours_by_id(hours_id))
+    
+    def update_hours_status(self, hours_id: str, status: str, verified_by: str, notes: str = None) -> bool:
+        return self.io.run(self.aio.update_hours_status(hours_id, status, verified_by, notes))
+    
+    def get_student_profile(self, student_id: str) -> Optional[Dict[str, Any]]:
+        return self.io.run(self.aio.get_student_profile(student_id))
+    
+    def get_hours_with_student(self, hours_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        return self.io.run(self.aio.get_hours_with_student(hours_id))
+    
+    def log_email_sent(self, recipient: str, template: str, subject: str, data: Dict[str, Any],
+                       status: str = 'sent') -> bool:
+        return self.io.run(self.aio.log_email_sent(recipient, template, subject, data, status))
+    
+    def insert_email_logs(self, rows: List[Dict[str, Any]]):
+        return self.io.run(self.aio.insert_email_logs(rows))
+    
+    def log_email_failed(self, recipient: str, template: str, subject: str, message: Dict[str, Any], error: str) -> bool:
+        return self.io.run(self.aio.log_email_failed(recipient, template, subject, message, error))
+    
+    def get_failed_emails(self, limit: int = 100) -> List[Dict[str, Any]]:
+        return self.io.run(self.aio.get_failed_emails(limit))
+    
+    def mark_email_sent(self, log_id: int) -> bool:
+        return self.io.run(self.aio.mark_email_sent(log_id))
+    
+    def get_admin_profile(self, admin_id: str) -> Optional[Dict[str, Any]]:
+        return self.io.run(self.aio.get_admin_profile(admin_id))
+    
+    def log_admin_activity(self, admin_id: str, action: str, details: Dict[str, Any]) -> bool:
+        return self.io.run(self.aio.log_admin_activity(admin_id, action, details))
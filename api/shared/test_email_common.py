@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Tests for the building blocks shared by both email services
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import email_common
+from email_common import (
+    AsyncSupabaseClient, CircuitBreaker, CircuitOpenError, Deadline, PROFILE_FIELDS, RenderedEmailCache,
+    run_with_deadline, SendRateLimiter
+)
+
+def fail(breaker, exc=RuntimeError):
+    with pytest.raises(exc):
+        with breaker.call():
+            raise exc('boom')
+
+def succeed(breaker):
+    with breaker.call():
+        pass
+
+def test_breaker_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        fail(breaker)
+    assert breaker.state == 'closed'
+
+    fail(breaker)
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        succeed(breaker)
+    assert breaker.stats()['rejected'] == 1
+    assert breaker.stats()['opened'] == 1
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=60)
+    fail(breaker)
+    succeed(breaker)
+    fail(breaker)
+    assert breaker.state == 'closed'
+
+def test_half_open_lets_one_trial_through_and_closes_on_success():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+    fail(breaker)
+    time.sleep(0.06)
+
+    breaker.allow()
+    assert breaker.state == 'half_open'
+    # Only the one trial is let through while it is in flight
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    breaker.record(True)
+    assert breaker.state == 'closed'
+    succeed(breaker)
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+    fail(breaker)
+    time.sleep(0.06)
+
+    fail(breaker)
+    assert breaker.state == 'open'
+    assert breaker.stats()['opened'] == 2
+    with pytest.raises(CircuitOpenError):
+        succeed(breaker)
+
+def test_exceptions_that_are_not_failures_count_as_successes():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=60)
+    with pytest.raises(ValueError):
+        with breaker.call(is_failure=lambda e: not isinstance(e, ValueError)):
+            raise ValueError('caller error')
+    assert breaker.state == 'closed'
+    assert breaker.stats()['successes'] == 1
+
+def test_render_cache_never_stores_failed_or_empty_renders():
+    cache = RenderedEmailCache(max_size=8, ttl=60)
+
+    def broken():
+        raise RuntimeError('template error')
+
+    with pytest.raises(RuntimeError):
+        cache.render('welcome', {'name': 'Sam'}, broken)
+    assert cache.render('welcome', {'name': 'Sam'}, lambda: ('', '')) == ('', '')
+    assert cache.stats()['size'] == 0
+
+    assert cache.render('welcome', {'name': 'Sam'}, lambda: ('<p>Hi Sam</p>', 'Hi Sam')) == ('<p>Hi Sam</p>', 'Hi Sam')
+    assert cache.render('welcome', {'name': 'Sam'}, broken) == ('<p>Hi Sam</p>', 'Hi Sam')
+
+def test_rate_limiter_never_waits_past_the_request_deadline(monkeypatch):
+    monkeypatch.setattr(email_common, 'STAGE_RESERVES', {})
+    limiter = SendRateLimiter(per_second=1, burst=1, per_day=0)
+    assert limiter.acquire() == 0
+
+    started = time.monotonic()
+    assert run_with_deadline(Deadline(0.1), limiter.acquire, max_wait=5) > 0
+    assert time.monotonic() - started < 0.1
+    assert limiter.usage()['deferred'] == 1
+
+    # A wait that fits in the budget is still taken
+    assert run_with_deadline(Deadline(5), limiter.acquire, max_wait=5) == 0
+
+def counting_client(respond):
+    """A client whose PostgREST requests are answered by `respond` after a short delay"""
+    client = AsyncSupabaseClient('http://postgrest.test', 'key')
+    client.calls = 0
+
+    async def request(method, table, stage=None, **kwargs):
+        client.calls += 1
+        await asyncio.sleep(0.05)
+        return respond(httpx.Request(method, f"{client.url}/rest/v1/{table}"))
+
+    client.request = request
+    return client
+
+def test_concurrent_identical_reads_make_one_upstream_call():
+    client = counting_client(lambda request: httpx.Response(200, json={'id': 'student-1', 'full_name': 'Sam'}, request=request))
+
+    async def read_many():
+        return await asyncio.gather(*(client.get_student_profile('student-1') for _ in range(10)))
+
+    profiles = asyncio.run(read_many())
+    assert client.calls == 1
+    assert profiles == [{'id': 'student-1', 'full_name': 'Sam'}] * 10
+    # Every caller gets its own copy
+    profiles[0]['full_name'] = 'Changed'
+    assert profiles[1]['full_name'] == 'Sam'
+    assert client.profiles.stats()['misses'] == 10
+    assert client.flights.stats()['deduplicated'] == 9
+
+def test_upstream_error_reaches_every_waiter():
+    def fail(request):
+        raise httpx.ConnectError('connection refused', request=request)
+
+    client = counting_client(fail)
+
+    async def read_many():
+        return await asyncio.gather(*(client.get_one('profiles', 'student-1', PROFILE_FIELDS) for _ in range(5)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(read_many())
+    assert client.calls == 1
+    assert all(isinstance(result, httpx.ConnectError) for result in results)
+    # Errors are not remembered: the next read goes upstream again
+    asyncio.run(read_many())
+    assert client.calls == 2
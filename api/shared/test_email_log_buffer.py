@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for EmailLogBuffer spill recovery: rows left by an exited writer are replayed exactly once
+"""
+
+import os
+import subprocess
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from email_common import EmailLogBuffer
+
+def spill_and_exit(spill_dir, count):
+    """Buffer rows in a separate process that dies before flushing them"""
+    subprocess.run([sys.executable, '-c', (
+        "import os, sys\n"
+        f"sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})\n"
+        "from email_common import EmailLogBuffer\n"
+        f"buffer = EmailLogBuffer(lambda rows: None, batch_size=100, flush_interval=60, spill_dir={spill_dir!r})\n"
+        f"for i in range({count}): buffer.add({{'recipient': f'student{{i}}@test.local'}})\n"
+        "os._exit(0)\n"
+    )], check=True)
+
+def recording_buffer(spill_dir):
+    inserted = []
+    return EmailLogBuffer(inserted.extend, batch_size=100, flush_interval=60, spill_dir=spill_dir), inserted
+
+def test_rows_from_an_exited_writer_are_replayed(tmp_path):
+    spill_and_exit(str(tmp_path), 3)
+
+    buffer, inserted = recording_buffer(str(tmp_path))
+    buffer.start()
+    buffer.close()
+
+    assert sorted(row['recipient'] for row in inserted) == [f'student{i}@test.local' for i in range(3)]
+    assert buffer.stats()['recovered'] == 3
+    assert os.listdir(tmp_path) == []
+
+def test_live_writer_files_are_left_alone(tmp_path):
+    writer, _ = recording_buffer(str(tmp_path))
+    writer.add({'recipient': 'student@test.local'})
+
+    # Same PID, still running: its spill file must not be taken
+    buffer, inserted = recording_buffer(str(tmp_path))
+    buffer.start()
+    buffer.close()
+
+    assert inserted == []
+    assert writer.stats()['pending'] == 1
+    writer.close()
+
+def test_concurrent_recoverers_replay_each_file_once(tmp_path):
+    for _ in range(3):
+        spill_and_exit(str(tmp_path), 5)
+
+    buffers = [recording_buffer(str(tmp_path)) for _ in range(4)]
+    start = threading.Barrier(len(buffers))
+
+    def recover(buffer):
+        start.wait()
+        buffer.start()
+
+    threads = [threading.Thread(target=recover, args=(buffer,)) for buffer, _ in buffers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for buffer, _ in buffers:
+        buffer.close()
+
+    replayed = [row['recipient'] for _, inserted in buffers for row in inserted]
+    assert len(replayed) == 15
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for the email outbox: claims must be exclusive across stores sharing one database
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from email_common import SQLiteOutboxStore
+
+def test_claims_are_exclusive_across_stores():
+    """Several stores on one SQLite file (one per worker process) never lease a row twice"""
+    path = os.path.join(tempfile.mkdtemp(), 'outbox.db')
+    stores = [SQLiteOutboxStore(path) for _ in range(4)]
+    message_ids = {stores[0].enqueue({'subject': f'Message {i}'}) for i in range(200)}
+
+    claimed = []
+    claimed_lock = threading.Lock()
+    start = threading.Barrier(len(stores) * 2)
+
+    def drain(store):
+        start.wait()
+        while True:
+            rows = store.claim(limit=5, lease=300)
+            if not rows:
+                return
+            with claimed_lock:
+                claimed.extend(row['id'] for row in rows)
+
+    threads = [threading.Thread(target=drain, args=(store,)) for store in stores * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == len(set(claimed)), 'a message was claimed by two workers'
+    assert set(claimed) == message_ids
+    assert stores[0].counts() == {'sending': 200}
+
+def test_expired_lease_is_claimed_again():
+    path = os.path.join(tempfile.mkdtemp(), 'outbox.db')
+    store = SQLiteOutboxStore(path)
+    message_id = store.enqueue({'subject': 'Hello'})
+    assert [row['id'] for row in store.claim(limit=10, lease=-1)] == [message_id]
+    rows = store.claim(limit=10, lease=300)
+    assert [(row['id'], row['attempts']) for row in rows] == [(message_id, 2)]
+    assert store.claim(limit=10, lease=300) == []